@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Speed and output equivalence benchmark of the parser backends
+
+Parses the statements of a SQL corpus with each backend, timing them, and compares each
+tree with the tree of the reference backend. When the trees differ, the translations
+to the target dialect are compared too, as different trees may format to the same SQL.
+The corpus is a directory of SQL scripts, or the synthetic workload of benchmarks/workload.py.
+
+Usage: python benchmarks/bench_backends.py [--corpus DIR] [--backends moz,moz_mysql] [--target spark] [--output results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from workload import Workload
+from run import select_statements
+from dora_parser import logger
+from dora_parser.backends import BACKENDS
+from dora_parser.parser import Parser, ParserError
+from dora_parser.reader import Reader
+from dora_parser.transpiler import Transpiler
+
+def read_corpus(corpus_dir:str) -> list:
+    """Scripts of the files of a directory, sorted by name"""
+    scripts = list()
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if os.path.isfile(path):
+            with open(path) as f: scripts.append(f.read())
+    return scripts
+
+def parse_all(queries:list, backend:str) -> tuple:
+    """Parse every statement with a backend, without the parse tree cache
+    :return: tree of each statement, None if it failed + elapsed seconds
+    """
+    # The grammar is built out of the timing
+    Parser("SELECT 1", cache=False, clean=False, backend=backend)
+    trees = list()
+    start = time.perf_counter()
+    for query in queries:
+        try:
+            trees.append(Parser(query, cache=False, clean=False, backend=backend).tree)
+        except ParserError:
+            trees.append(None)
+    return trees, time.perf_counter() - start
+
+def translate(transpiler:Transpiler, tree:dict) -> str:
+    """SQL of a tree in the target dialect"""
+    return transpiler.format(transpiler.resolve(tree))
+
+def compare(queries:list, reference:list, trees:list, transpiler:Transpiler, show:int) -> dict:
+    """Compare the trees of a backend with the reference trees
+    :return: number of statements of each outcome
+    """
+    counts = {"Same_tree": 0, "Same_sql": 0, "Different": 0, "Failed": 0, "Only_parsed": 0}
+    for query, ref_tree, tree in zip(queries, reference, trees):
+        if tree is None or ref_tree is None:
+            if ref_tree is not None:
+                counts["Failed"] += 1
+            elif tree is not None:
+                counts["Only_parsed"] += 1
+            continue
+        if tree == ref_tree:
+            counts["Same_tree"] += 1
+        elif translate(transpiler, tree) == translate(transpiler, ref_tree):
+            counts["Same_sql"] += 1
+        else:
+            counts["Different"] += 1
+            if show > 0:
+                show -= 1
+                print(f"  different: {query.strip()[:200]}")
+    return counts
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--corpus", default=None, help="Directory of SQL scripts, the synthetic workload if not set")
+    arg_parser.add_argument("--backends", default=",".join(BACKENDS), help="The first one is the reference")
+    arg_parser.add_argument("--target", default="spark")
+    arg_parser.add_argument("--files", type=int, default=20)
+    arg_parser.add_argument("--statements", type=int, default=40)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--show", type=int, default=5, help="Different statements printed per backend")
+    arg_parser.add_argument("--output", default=None)
+    args = arg_parser.parse_args()
+
+    logger.setLevel(logging.CRITICAL)
+    if args.corpus is not None:
+        scripts = read_corpus(args.corpus)
+    else:
+        corpus_dir = tempfile.mkdtemp(prefix="dora_bench_in_")
+        try:
+            Workload(seed=args.seed).corpus(corpus_dir, args.files, args.statements)
+            scripts = read_corpus(corpus_dir)
+        finally:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+    queries = select_statements(scripts, Reader("impala", args.target))
+    transpiler = Transpiler("impala", args.target)
+    backends = list(filter(None, args.backends.split(",")))
+    print(f"{len(queries)} statements, reference backend {backends[0]}")
+    print(f"{'backend':<12}{'seconds':>10}{'per s':>10}{'parsed':>8}{'same tree':>11}{'same sql':>10}{'different':>11}{'failed':>8}")
+    results = dict()
+    reference = None
+    for backend in backends:
+        trees, seconds = parse_all(queries, backend)
+        reference = trees if reference is None else reference
+        counts = compare(queries, reference, trees, transpiler, args.show if backend != backends[0] else 0)
+        results[backend] = dict(counts, Seconds=round(seconds, 6), Parsed=sum(tree is not None for tree in trees))
+        per_second = len(queries) / seconds if seconds else 0
+        print(f"{backend:<12}{seconds:>10.3f}{per_second:>10.1f}{results[backend]['Parsed']:>8}{counts['Same_tree']:>11}"
+              f"{counts['Same_sql']:>10}{counts['Different']:>11}{counts['Failed']:>8}")
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"statements": len(queries), "target": args.target, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Benchmark of Transpiler.resolve against the previous recursive implementation
+
+Usage: python benchmarks/bench_resolve.py [--dialect spark] [--repeat 5]
+"""
+import argparse
+import logging
+import time
+from dora_parser import logger
+from dora_parser.dialects import WordToImplement
+from dora_parser.transpiler import Transpiler
+
+def legacy_resolve(transpiler:Transpiler, tree:dict) -> dict:
+    """Recursive resolve, as implemented before the explicit stack version"""
+    if isinstance(tree, dict):
+        for key, value in tree.items():
+            legacy_resolve(transpiler, value)
+            try:
+                _word = str(key).upper()
+                if _word in transpiler.dialect.words:
+                    _old = tree.pop(key)
+                    try:
+                        _new = transpiler.dialect.words[_word](value)
+                    except Exception as err:
+                        _new = WordToImplement(err)
+                    if isinstance(_new, WordToImplement):
+                        transpiler._errors.append({key:(str(_new.id) + ":" + str(_new.level) + ":" + str(_new))})
+                        tree[_word]=_old
+                    elif isinstance(_new, dict):
+                        for _key, _value in _new.items():
+                            tree[_key]=_value
+                    return tree
+            except Exception as err:
+                transpiler._errors.append({key:err})
+    if isinstance(tree, list):
+        for value in tree:
+            legacy_resolve(transpiler, value)
+    return tree
+
+def wide_tree(width:int) -> dict:
+    """SELECT with many translated columns"""
+    columns = [{"value": {"decode": [f"c{i}", 1, {"literal": "a"}, 2, {"literal": "b"}, {"literal": "c"}]},
+                "name": f"n{i}"} for i in range(width)]
+    return {"select": columns, "from": "t"}
+
+def deep_tree(depth:int) -> dict:
+    """SELECT with one column of nested function calls"""
+    node = "c"
+    for i in range(depth):
+        node = {"nvl": [node, i]}
+    return {"select": {"value": node}, "from": "t"}
+
+def union_tree(width:int) -> dict:
+    """Long UNION ALL chain of small selects"""
+    return {"union_all": [{"select": {"value": {"nvl": [f"c{i}", 0]}}, "from": f"t{i}"} for i in range(width)]}
+
+def measure(function, build, repeat:int) -> str:
+    """Best time of the function over fresh trees, the legacy resolve changes them in place"""
+    best = None
+    for _ in range(repeat):
+        _tree = build()
+        start = time.perf_counter()
+        try:
+            function(_tree)
+        except RecursionError:
+            return "RecursionError"
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return f"{best * 1000:.2f} ms"
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--dialect", default="spark")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+    logger.setLevel(logging.CRITICAL)
+    transpiler = Transpiler("impala", args.dialect)
+    cases = [("wide 100", wide_tree, 100), ("wide 2000", wide_tree, 2000),
+             ("deep 100", deep_tree, 100), ("deep 5000", deep_tree, 5000),
+             ("union 1000", union_tree, 1000)]
+    print(f"{'tree':<12}{'recursive':>18}{'explicit stack':>18}")
+    for name, function, size in cases:
+        build = lambda: function(size)
+        legacy = measure(lambda t: legacy_resolve(transpiler, t), build, args.repeat)
+        current = measure(transpiler.resolve, build, args.repeat)
+        print(f"{name:<12}{legacy:>18}{current:>18}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Startup time benchmark of the command line interface
+
+Runs a single --query translation in fresh interpreters and fails when it is slower
+than --max-ms, 3000 by default, or when it imports the report dependencies.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--max-ms 3000 | --max-ms 0 to only check the imports]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ['pandas', 'seaborn', 'matplotlib']
+
+QUERY_RUN = """
+import sys
+from dora_parser.__main__ import cli_translate
+cli_translate(to_dialect='spark', query="SELECT DECODE(a, 1, 'x', 'y') FROM t")
+print(",".join(name for name in {modules} if name in sys.modules))
+"""
+
+def run(code:str) -> tuple:
+    """Run the code in a fresh interpreter
+    :return: wall time in milliseconds + standard output
+    """
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return (time.perf_counter() - start) * 1000, out.stdout.strip()
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--max-ms", type=float, default=3000, help="Fail when the median is above this value, 0 to disable")
+    args = arg_parser.parse_args()
+    interpreter = statistics.median(run("pass")[0] for _ in range(args.repeat))
+    timings = list()
+    loaded = ""
+    for _ in range(args.repeat):
+        elapsed, loaded = run(QUERY_RUN.format(modules=HEAVY_MODULES))
+        timings.append(elapsed)
+    median = statistics.median(timings)
+    print(f"interpreter: {interpreter:.0f} ms")
+    print(f"--query translation: median {median:.0f} ms, min {min(timings):.0f} ms, max {max(timings):.0f} ms")
+    failed = False
+    if loaded:
+        print(f"FAIL: report dependencies imported by a query translation: {loaded}")
+        failed = True
+    if args.max_ms and median > args.max_ms:
+        print(f"FAIL: median above {args.max_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
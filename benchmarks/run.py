@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Throughput benchmark of each translation stage over a synthetic Impala workload
+
+Times Parser, Transpiler.resolve, Transpiler.format, Reader.translate_script and
+Reader.translate_files for each target dialect, and writes the results as JSON.
+Runs offline, the workload is generated by benchmarks/workload.py.
+
+Usage:
+    python benchmarks/run.py [--output results.json] [--targets spark,athena] [--files 20] [--statements 40]
+    python benchmarks/run.py --compare base.json new.json [--threshold 0.1]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from workload import Workload, parse_mix
+from dora_parser import __version__, logger
+from dora_parser.parser import Parser
+from dora_parser.reader import Reader
+from dora_parser.rules import ALLOWED
+from dora_parser.splitter import StatementSplitter
+from dora_parser.transpiler import Transpiler
+from dora_parser.parser import ParserError
+
+STAGES = ["parser", "resolve", "format", "translate_script", "translate_files"]
+
+def best_of(function, repeat:int) -> float:
+    """Best wall time of the function, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def select_statements(scripts:list, reader:Reader) -> list:
+    """Statements of the scripts that go through the parser, as the reader sends them"""
+    queries = list()
+    for script in scripts:
+        for query in StatementSplitter(script):
+            kind, matched = reader.rules.classify(query.lstrip())
+            if kind == ALLOWED:
+                queries.append(matched)
+    return queries
+
+def bench_target(target:str, scripts:list, corpus_dir:str, repeat:int) -> dict:
+    """Time every stage for one target dialect"""
+    reader = Reader("impala", target)
+    transpiler = Transpiler("impala", target)
+    queries = select_statements(scripts, reader)
+    trees = list()
+    for query in queries:
+        try:
+            trees.append(Parser(query, cache=False, clean=False).tree)
+        except ParserError:
+            pass
+    resolved = [transpiler.resolve(tree) for tree in trees]
+
+    def parse():
+        for query in queries:
+            try:
+                Parser(query, cache=False, clean=False)
+            except ParserError:
+                pass
+
+    def translate_files():
+        output_dir = tempfile.mkdtemp(prefix="dora_bench_out_")
+        try:
+            Reader("impala", target, corpus_dir + os.sep, output_dir + os.sep).translate_files()
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    def translate_scripts():
+        Parser.cache.clear()
+        for script in scripts:
+            reader.translate_script(script)
+
+    counts = {"parser": len(queries), "resolve": len(trees), "format": len(resolved),
+              "translate_script": len(scripts), "translate_files": len(scripts)}
+    timings = {
+        "parser": best_of(parse, repeat),
+        "resolve": best_of(lambda: [transpiler.resolve(tree) for tree in trees], repeat),
+        "format": best_of(lambda: [transpiler.format(tree) for tree in resolved], repeat),
+        "translate_script": best_of(translate_scripts, repeat),
+        "translate_files": best_of(lambda: (Parser.cache.clear(), translate_files()), repeat),
+    }
+    return {stage: {"seconds": round(timings[stage], 6), "items": counts[stage],
+                    "per_second": round(counts[stage] / timings[stage], 2) if timings[stage] else None}
+            for stage in STAGES}
+
+def compare(base_path:str, new_path:str, threshold:float) -> int:
+    """Print the time ratio of each stage and flag the regressions
+    :return: number of regressions
+    """
+    with open(base_path) as f: base = json.load(f)
+    with open(new_path) as f: new = json.load(f)
+    regressions = 0
+    print(f"{'target':<10}{'stage':<18}{'base s':>10}{'new s':>10}{'ratio':>8}")
+    for target, stages in new["results"].items():
+        for stage, result in stages.items():
+            if (old := base["results"].get(target, dict()).get(stage)) is None:
+                continue
+            ratio = result["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{target:<10}{stage:<18}{old['seconds']:>10.3f}{result['seconds']:>10.3f}{ratio:>8.2f}{flag}")
+    return regressions
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--output", default="bench_results.json")
+    arg_parser.add_argument("--targets", default="spark,athena")
+    arg_parser.add_argument("--files", type=int, default=20)
+    arg_parser.add_argument("--statements", type=int, default=40)
+    arg_parser.add_argument("--columns", type=int, default=6)
+    arg_parser.add_argument("--depth", type=int, default=2)
+    arg_parser.add_argument("--mix", type=parse_mix, default=None)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    arg_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before flagging, 0.10 is 10%%")
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    logger.setLevel(logging.CRITICAL)
+    workload = Workload(seed=args.seed, mix=args.mix, columns=args.columns, depth=args.depth)
+    corpus_dir = tempfile.mkdtemp(prefix="dora_bench_in_")
+    try:
+        paths = workload.corpus(corpus_dir, args.files, args.statements)
+        scripts = list()
+        for path in paths:
+            with open(path) as f: scripts.append(f.read())
+        results = dict()
+        for target in filter(None, args.targets.split(",")):
+            results[target] = bench_target(target, scripts, corpus_dir, args.repeat)
+            for stage, result in results[target].items():
+                print(f"{target:<10}{stage:<18}{result['seconds']:>10.3f} s{result['per_second'] or 0:>12.1f}/s")
+    finally:
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "threshold")}
+    with open(args.output, "w") as f:
+        json.dump({"version": __version__, "python": platform.python_version(), "config": config,
+                   "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Synthetic Impala workload generator
+
+The same seed and options always produce the same scripts.
+
+Usage: python benchmarks/workload.py OUTPUT_DIR [--files 50] [--statements 40] [--seed 0] [--mix select=4,cte=2]
+"""
+import argparse
+import os
+import random
+
+# Default share of each statement kind
+MIX = {"select": 4, "cte": 2, "functions": 3, "not_allowed": 1, "replace": 1}
+
+# Impala functions rewritten by the target dialects
+FUNCTIONS = [
+    lambda r, arg: f"DECODE({arg}, 1, 'one', 2, 'two', 'other')",
+    lambda r, arg: f"TRUNC({arg}, '{r.choice(['YEAR', 'MONTH', 'SYEAR', 'Q'])}')",
+    lambda r, arg: f"MONTHS_ADD({arg}, {r.randint(1, 12)})",
+    lambda r, arg: f"NVL({arg}, 0)",
+    lambda r, arg: f"ZEROIFNULL({arg})",
+    lambda r, arg: f"DCEIL({arg})",
+    lambda r, arg: f"CHAR_LENGTH({arg})",
+    lambda r, arg: f"ISNULL({arg}, 'n/a')",
+    lambda r, arg: f"ADD_MONTHS({arg}, {r.randint(1, 12)})",
+]
+
+NOT_ALLOWED = [
+    "COMPUTE STATS {table}",
+    "INVALIDATE METADATA {table}",
+    "REFRESH {table}",
+    "ALTER TABLE {table} ADD COLUMN c_new INT",
+    "DROP TABLE IF EXISTS {table} PURGE",
+    "SET MEM_LIMIT=10g",
+]
+
+def parse_mix(text:str) -> dict:
+    """Parse a statement mix as 'select=4,cte=2,functions=3,not_allowed=1,replace=1'"""
+    mix = dict()
+    for item in filter(None, text.split(",")):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in MIX:
+            raise ValueError(f"Unknown statement kind:{kind}, use one of {list(MIX)}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+class Workload():
+    """Generator of reproducible Impala scripts"""
+
+    def __init__(self, seed:int=0, mix:dict=None, columns:int=6, depth:int=2):
+        """Initialize the workload class
+        :param seed: Random seed
+        :param mix: Relative weight of each statement kind, see MIX
+        :param columns: Number of columns of each select
+        :param depth: Nesting depth of the function calls
+        """
+        self.random = random.Random(seed)
+        self.mix = dict(MIX if mix is None else mix)
+        self.columns = columns
+        self.depth = depth
+
+    def _table(self) -> str:
+        return f"db{self.random.randint(0, 9)}.t{self.random.randint(0, 999)}"
+
+    def _expression(self, depth:int) -> str:
+        expression = f"c{self.random.randint(0, 99)}"
+        for _ in range(depth):
+            expression = self.random.choice(FUNCTIONS)(self.random, expression)
+        return expression
+
+    def _columns(self, depth:int) -> str:
+        return ", ".join(f"{self._expression(depth)} AS a{i}" for i in range(self.columns))
+
+    def statement(self, kind:str) -> str:
+        """Generate one statement of the given kind, ended by a semicolon"""
+        table = self._table()
+        if kind == "select":
+            return f"SELECT {self._columns(0)} FROM {table} WHERE c1 > {self.random.randint(0, 1000)};"
+        if kind == "cte":
+            return (f"WITH w AS (SELECT {self._columns(self.depth)} FROM {table})\n"
+                    f"SELECT a0, COUNT(*) AS n FROM w GROUP BY a0 ORDER BY n DESC LIMIT 10;")
+        if kind == "functions":
+            return f"INSERT INTO {self._table()} SELECT {self._columns(self.depth)} FROM {table};"
+        if kind == "not_allowed":
+            return self.random.choice(NOT_ALLOWED).format(table=table) + ";"
+        return f"CREATE EXTERNAL TABLE {table} (a VARCHAR(10), b DOUBLE, c CHAR(3));"
+
+    def script(self, statements:int) -> str:
+        """Generate a script with the given number of statements"""
+        kinds = self.random.choices(list(self.mix), weights=list(self.mix.values()), k=statements)
+        lines = ["-- generated by benchmarks/workload.py"]
+        for i, kind in enumerate(kinds):
+            if i % 5 == 0:
+                lines.append(f"/* block {i} */")
+            lines.append(self.statement(kind))
+        return "\n".join(lines) + "\n"
+
+    def corpus(self, output_dir:str, files:int, statements:int) -> list:
+        """Write a directory of generated scripts
+        :return: list of file paths
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = list()
+        for i in range(files):
+            path = os.path.join(output_dir, f"script_{i:05d}.sql")
+            with open(path, "w") as f:
+                f.write(self.script(statements))
+            paths.append(path)
+        return paths
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("output_dir")
+    arg_parser.add_argument("--files", type=int, default=50)
+    arg_parser.add_argument("--statements", type=int, default=40)
+    arg_parser.add_argument("--columns", type=int, default=6)
+    arg_parser.add_argument("--depth", type=int, default=2)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--mix", type=parse_mix, default=None)
+    args = arg_parser.parse_args()
+    workload = Workload(seed=args.seed, mix=args.mix, columns=args.columns, depth=args.depth)
+    paths = workload.corpus(args.output_dir, args.files, args.statements)
+    print(f"{len(paths)} files written to {args.output_dir}")
+
+if __name__ == '__main__':
+    main()
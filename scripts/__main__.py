@@ -15,48 +15,150 @@
 # limitations under the License.
 #
 """Dora Parser Command Line interface"""
+import os
 import fire
-from dora_parser.parser import Parser
-from dora_parser.transpiler import Transpiler
-from dora_parser.reader import Reader
+from dora_parser import profiler
 
-def cli_translate(from_dialect:str='impala', to_dialect:str='athena', query:str=None, script:str=None, input_dir=None, output_dir=None, summary:bool=False, migration_report:bool=False):
+def cli_translate(from_dialect:str='impala', to_dialect:str='athena', query:str=None, script:str=None, input_dir=None, output_dir=None, summary:bool=False, migration_report:bool=False, workers:int=1, incremental:bool=False, profile:str=None, report_backend:str='html', export:str=None, fingerprint:bool=False, server:str=None, port:int=8765, parse_timeout:float=None, summary_store:str=None, translation_cache:str=None, prune_cache:bool=False, statement_chunksize:int=None, passthrough:bool=False, verify_passthrough:float=0.0, parser_backend:str=None, recursive:bool=False, include=None, exclude=None, encoding:str=None):
     """ CLI translate class
     :param from_dialect: From SQL dialect
-    :param to_dialect: To SQL dialect
+    :param to_dialect: To SQL dialect, or comma separated target dialects, each written to a folder named after it
     :param query: Query to translate
-    :param script: Script to translate
-    :param input_dir: Input Directory
+    :param script: Script to translate, or the path of a script file, read in chunks as it is translated
+    :param input_dir: Input Directory, or a zip or tar archive of the files to translate
     :param output_dir: Optional output Directory
     :param summary: Optional summary of sucesseded and failed queries
     :param migration_report: If true, creates the migration report
+    :param workers: Number of processes used to translate the input directory files
+    :param incremental: If true, only translates the files changed since the last run
+    :param profile: Optional JSON file with the time of each stage, file and the slowest statements
+    :param report_backend: Migration report backend, "html" and "paginated" need no extra dependency, "pandas" uses pandas and seaborn
+    :param export: Optional file with one record per translated statement of the input directory, JSON lines or .parquet with pyarrow
+    :param fingerprint: If true, statements that only differ in their literals are translated once through a shared template
+    :param server: "stdio" answers JSON line requests on stdin/stdout, "http" serves JSON requests on localhost, see dora_parser.server
+    :param port: Port of the http server
+    :param parse_timeout: Optional time limit to parse each statement of a script or input directory, in seconds
+    :param summary_store: Optional JSON lines file for the per-file summaries of the input directory, instead of memory
+    :param translation_cache: Optional SQLite file with the translated statements, reused by the next runs
+    :param prune_cache: If true, removes the stale entries of the translation cache and compacts it
+    :param statement_chunksize: With more than one worker, the statements of the script or of each file are translated
+        by the workers in chunks of this size, for scripts too large to be split by file
+    :param passthrough: If true, statements without any word rewritten by the target dialect are copied as they are.
+        They are not parsed, so the ones the parser would reject are not reported as failed, they are counted as Copied
+    :param verify_passthrough: Fraction of the copied statements also translated in full to check them, from 0 to 1
+    :param parser_backend: Parser backend, "moz" by default, see dora_parser.backends
+    :param recursive: If true, also translates the files of the input directory subdirectories, keeping their paths
+    :param include: Optional glob patterns of the input directory files to translate, as "*.sql" or "*.sql,*.hql"
+    :param exclude: Optional glob patterns of the input directory files to skip
+    :param encoding: Optional encoding of the input files, utf-8 for the archive members by default
     """
+    if profile is not None:
+        options = dict(locals(), profile=None)
+        prof = profiler.enable()
+        try:
+            return cli_translate(**options)
+        finally:
+            prof.save(profile)
+            profiler.disable()
+    if not isinstance(to_dialect, str):
+        to_dialect = ",".join(to_dialect)
+    if "," in to_dialect and query is not None:
+        # Each target is translated in turn, the parse tree is reused through the Parser cache
+        options = dict(locals())
+        return "".join(f"\n[{target.strip()}]" + cli_translate(**dict(options, to_dialect=target.strip()))
+                       for target in to_dialect.split(","))
+    # Modules are imported by each path, so a query translation does not load the reader
+    if server is not None:
+        from dora_parser.server import TranslationServer, serve_stdio, serve_http
+        if server not in ("stdio", "http"):
+            raise ValueError("server must be stdio or http")
+        # More than one worker answers the requests in a process pool
+        server_ = TranslationServer(workers=workers if workers > 1 else 0)
+        try:
+            serve_stdio(server_) if server == "stdio" else serve_http(server_, port=port)
+        finally:
+            server_.close()
+        return None
+    if prune_cache:
+        from dora_parser.cache import TranslationCache
+        if translation_cache is None:
+            raise ValueError("prune_cache needs the translation_cache file")
+        cache = TranslationCache(translation_cache)
+        try:
+            return f"\nRemoved {cache.prune()} translations from {translation_cache}"
+        finally:
+            cache.close()
     if query is not None:
+        from dora_parser.parser import Parser
+        from dora_parser.transpiler import Transpiler
         transpiler = Transpiler(from_dialect, to_dialect)
-        result, errors = transpiler.translate(Parser(query))
+        if translation_cache is not None:
+            from dora_parser.backends import load_backend
+            from dora_parser.cache import TranslationCache
+            cache = TranslationCache(translation_cache)
+            statement = Parser.clean(query).strip()
+            # Keyed by the backend in use, as Reader.translate_statement
+            backend = load_backend(parser_backend).name
+            try:
+                translation = cache.get(transpiler, statement, backend)
+                if translation is None:
+                    translation = transpiler.translate(Parser(statement, clean=False, backend=backend))
+                    cache.put(transpiler, statement, translation, backend)
+            finally:
+                cache.close()
+            result, errors = translation
+        else:
+            result, errors = transpiler.translate(Parser(query, backend=parser_backend))
         if len(errors) ==0:
             return f"\nResult: {result}"
         return f"\nResult: {result} \nErrors: {errors}\n"
     if script is not None:
-        errors_ = []
-        reader = Reader(from_dialect, to_dialect)
-        result, errors, n_queries = reader.translate_script(script)
-        if summary is not False:
-            summary_ = reader.create_summary(errors, n_queries)
-            print("\nSummary: ",summary_)
-        #Remove from the list the elements that are empty, to present a cleaner output
-        for error in errors:
-            if len(error) != 0: 
-                errors_.append(error)
-        if len(errors_) ==0:
-            return f"\nResult: {result}" 
-        return f"\nResult: {result} \nErrors: {errors_} \nNumber of queries: {n_queries}" 
+        from dora_parser.reader import Reader
+        reader = Reader(from_dialect, to_dialect, workers=workers, fingerprint=fingerprint, parse_timeout=parse_timeout, translation_cache=translation_cache, statement_chunksize=statement_chunksize, passthrough=passthrough, verify_passthrough=verify_passthrough, parser_backend=parser_backend)
+        # The script is split and each statement parsed once for every target
+        if os.path.isfile(script):
+            with open(script, encoding=encoding) as f:
+                translated = reader.translate_script(f)
+        else:
+            translated = reader.translate_script(script)
+        if len(reader.targets) == 1:
+            translated = {reader.to_dialect: translated}
+        output = ""
+        for target, (result, errors, n_queries) in translated.items():
+            target_reader = reader.readers[target]
+            errors_ = []
+            if summary is not False:
+                summary_ = reader.create_summary(errors, n_queries, reader.copied[target] if passthrough else None)
+                print("\nSummary: ",summary_)
+                print("\nTemplates: ",target_reader.templates.stats()) if fingerprint else None
+                print("\nPassthrough: ",target_reader.pass_through.stats()) if passthrough else None
+            #Remove from the list the elements that are empty, to present a cleaner output
+            for error in errors:
+                if len(error) != 0: 
+                    errors_.append(error)
+            output += f"\n[{target}]" if len(reader.targets) > 1 else ""
+            if len(errors_) ==0:
+                output += f"\nResult: {result}"
+            else:
+                output += f"\nResult: {result} \nErrors: {errors_} \nNumber of queries: {n_queries}"
+        return output
     if input_dir is not None:
-        reader = Reader(from_dialect, to_dialect, input_dir, output_dir, migration_report)
-        reader.translate_files()
+        from dora_parser.reader import Reader
+        reader = Reader(from_dialect, to_dialect, input_dir=input_dir, output_dir=output_dir, migration_report=migration_report, workers=workers,
+                        incremental=incremental, report_backend=report_backend, export=export, fingerprint=fingerprint,
+                        parse_timeout=parse_timeout, summary_store=summary_store, translation_cache=translation_cache,
+                        statement_chunksize=statement_chunksize, passthrough=passthrough, verify_passthrough=verify_passthrough,
+                        parser_backend=parser_backend, recursive=recursive, include=include, exclude=exclude, encoding=encoding)
+        summary_ = reader.translate_files(summary_dict=True)
         if summary is not False:
-            summary_ = reader.translate_files(summary_dict=True)
             print("\nSummary: ",summary_)
+        if output_dir is None and reader.from_archive:
+            # The translations of an archive are written next to it
+            output_dir = reader.output_dir
+        if len(reader.targets) > 1:
+            output = input_dir if output_dir is None else output_dir
+            return "".join(f"\nTranspiled {target} statements are in {output}{target}/Fully Translated/ and {output}{target}/Partially Translated/ folders."
+                           for target in reader.targets)
         if output_dir is not None:
             return f"\nTranspiled statements are in {output_dir}Fully Translated/ and {output_dir}Partially Translated/ folders."
         return f"\nTranspiled statements are in {input_dir}Fully Translated/ and {input_dir}Partially Translated/ folders."
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Archive Implementation"""
+import io
+import os
+import posixpath
+import tarfile
+import zipfile
+from dora_parser import logger
+
+class SQLArchive():
+    """Zip or tar archive read as an input directory, without extracting its members"""
+
+    @classmethod
+    def is_archive(cls, path:str) -> bool:
+        """Check if a path is a zip or tar archive, compressed or not
+        :param path: Input path
+        """
+        return path is not None and os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+    def __init__(self, path:str, encoding:str=None):
+        """Initialize the archive class
+        :param path: Archive path, .zip, .tar, .tar.gz, .tar.bz2 or .tar.xz
+        :param encoding: Encoding of the members, utf-8 if None. A byte order mark is left out by StatementSplitter
+        """
+        self.path = path
+        self.encoding = "utf-8" if encoding is None else encoding
+        self._zip = None
+        self._tar = None
+        self._members = None
+        if zipfile.is_zipfile(path):
+            self._zip = zipfile.ZipFile(path)
+            # Zip members are read at their offset
+            self.random_access = True
+        else:
+            self._tar = tarfile.open(path, "r:*")
+            # A compressed tar is decompressed up to the member read, so its members are read in archive order
+            self.random_access = isinstance(self._tar.fileobj, io.BufferedReader)
+
+    @classmethod
+    def member_name(cls, name:str) -> str:
+        """Member path relative to the archive root, None if it points outside of it
+        :param name: Member name
+        """
+        name = posixpath.normpath(name.replace("\\", "/"))
+        if name.startswith("/") or name == ".." or name.startswith("../"):
+            return None
+        return name
+
+    def members(self) -> list:
+        """Files of the archive, in archive order
+        :return: path and size of each member
+        """
+        if self._members is None:
+            self._members = dict()
+            if self._zip is not None:
+                entries = [(info.filename, info, info.file_size) for info in self._zip.infolist() if not info.is_dir()]
+            else:
+                entries = [(info.name, info, info.size) for info in self._tar.getmembers() if info.isfile()]
+            for name, info, size in entries:
+                member = self.member_name(name)
+                if member is None:
+                    logger.warning("Archive member ignored:\n--ARCHIVE:%s", name)
+                    continue
+                self._members[member] = info, size
+        return [(member, size) for member, (_, size) in self._members.items()]
+
+    def open_binary(self, member:str):
+        """Open a member as a binary file
+        :param member: Member path, see members
+        """
+        self.members()
+        info, _ = self._members[member]
+        if self._zip is not None:
+            return self._zip.open(info)
+        return self._tar.extractfile(info)
+
+    def open(self, member:str, newline:str=None) -> io.TextIOWrapper:
+        """Open a member as a text file, decoded with the archive encoding
+        :param member: Member path, see members
+        :param newline: Line break translation, as open
+        """
+        return io.TextIOWrapper(self.open_binary(member), encoding=self.encoding, newline=newline)
+
+    def close(self):
+        """Close the archive"""
+        self._zip.close() if self._zip is not None else None
+        self._tar.close() if self._tar is not None else None
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Parser Backend Implementation
+
+A backend parses a SQL statement to the moz tree, the format produced by mo_sql_parsing
+and read by the transpiler and dialects. Other parsers may be plugged in by converting
+their own trees to it. Each backend declares the exceptions raised for the statements it
+can not parse, and Parser raises them as ParserError, so callers do not depend on the
+backend in use.
+"""
+import os
+from functools import lru_cache
+from importlib import import_module
+
+# Backend name: (module, class), the module is only imported when the backend is used
+BACKENDS = {
+    'moz': ('dora_parser.backends', 'MozBackend'),
+    'moz_mysql': ('dora_parser.backends', 'MozMySQLBackend'),
+}
+
+# Backend used when none is given
+DEFAULT_BACKEND = os.environ.get('DORA_PARSER_BACKEND', 'moz')
+
+class ParserError(Exception):
+    """The statement can not be parsed by the backend"""
+
+    def __init__(self, message:str, query:str=None, backend:str=None):
+        """Initialize the exception class
+        :param message: Backend error message
+        :param query: Statement that was not parsed
+        :param backend: Backend name
+        """
+        super().__init__(message)
+        self.query = query
+        self.backend = backend
+
+class ParserBackend():
+    """Parser of SQL statements to the moz tree"""
+    name = None
+    # Exceptions raised by parse for the statements that can not be parsed
+    errors = ()
+
+    def parse(self, query:str) -> dict:
+        """Parse a statement
+        :param query: SQL query without comments
+        :return: moz tree
+        """
+        raise NotImplementedError
+
+class MozBackend(ParserBackend):
+    """mo_sql_parsing default grammar"""
+    name = 'moz'
+
+    def __init__(self):
+        from mo_sql_parsing import parse
+        from mo_parsing.exceptions import ParseException
+        self._parse = parse
+        self.errors = (ParseException,)
+
+    def parse(self, query:str) -> dict:
+        return self._parse(query)
+
+class MozMySQLBackend(MozBackend):
+    """mo_sql_parsing MySQL grammar, where double quoted text is a string literal, as in Impala and Hive"""
+    name = 'moz_mysql'
+
+    def __init__(self):
+        super().__init__()
+        from mo_sql_parsing import parse_mysql
+        self._parse = parse_mysql
+
+def register_backend(name:str, module:str, class_name:str):
+    """Register a parser backend class without importing it
+    :param name: Backend name
+    :param module: Module path of the backend class
+    :param class_name: Backend class name, a ParserBackend
+    """
+    BACKENDS[str(name).lower()] = (module, class_name)
+    load_backend.cache_clear()
+
+@lru_cache(maxsize=None)
+def load_backend(name:str=None) -> ParserBackend:
+    """Import and create the backend by name, once per process
+    :param name: Backend name, DEFAULT_BACKEND if None
+    :return: ParserBackend object
+    """
+    name = DEFAULT_BACKEND if name is None else str(name).lower()
+    try:
+        module, class_name = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Only the following parser backends are supported:{list(BACKENDS)}") from None
+    return getattr(import_module(module), class_name)()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Cache Implementation"""
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock
+
+class LRUCache():
+    """Bounded least recently used cache with hit, miss and eviction counters"""
+
+    def __init__(self, maxsize:int=1024):
+        """Initialize the cache class
+        :param maxsize: Maximum number of entries, 0 disables the cache
+        """
+        self.maxsize = max(int(maxsize), 0)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value and mark it as the most recently used
+        :param key: Cache key
+        :param default: Value returned when the key is not cached
+        :return: cached value
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries when full
+        :param key: Cache key
+        :param value: Value to cache
+        """
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self, maxsize:int):
+        """Change the cache capacity, evicting entries if needed
+        :param maxsize: Maximum number of entries, 0 disables the cache
+        """
+        with self._lock:
+            self.maxsize = max(int(maxsize), 0)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> dict:
+        """Cache statistics
+        :return: dictionary with hits, misses, evictions, size and maxsize
+        """
+        return {"Hits": self.hits, "Misses": self.misses, "Evictions": self.evictions,
+                "Size": len(self._data), "Maxsize": self.maxsize}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+def rules_fingerprint(dialect) -> str:
+    """Hash of the source code of the target dialect, the source dialect and the dialect base classes
+    :param dialect: Dialect instance, as Transpiler.dialect
+    :return: hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    # The module of each class the target dialect inherits from, as Athena from Presto, once
+    modules = [sys.modules.get(cls.__module__) for cls in type(dialect).__mro__]
+    modules += [getattr(dialect, "source", None), sys.modules.get("dora_parser.dialects")]
+    for module in dict.fromkeys(module for module in modules if module is not None):
+        path = getattr(module, "__file__", None)
+        if path is not None:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+class TranslationCache():
+    """Persistent cache of translated statements in a SQLite file, shared by runs, processes and machines.
+    Entries are keyed by the dialect pair, the package version, the dialect rules fingerprint and the statement,
+    the least recently used ones are evicted when the file grows over max_bytes."""
+
+    # Operations between commits
+    COMMIT_EVERY = 100
+
+    def __init__(self, path:str, max_bytes:int=256 * 1024 * 1024):
+        """Initialize the cache class
+        :param path: SQLite file, created if it does not exist
+        :param max_bytes: Maximum size of the cached statements and translations
+        """
+        from dora_parser import __version__
+        self.path = path
+        self.version = __version__
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        # Rows and use times written by the next commit
+        self._rows = list()
+        self._used = list()
+        self._fingerprints = dict()
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS translations (
+                             key TEXT PRIMARY KEY, pair TEXT, version TEXT, rules TEXT,
+                             sql TEXT, problems TEXT, size INTEGER, used REAL)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS translations_used ON translations (used)")
+        self.conn.commit()
+
+    def key(self, transpiler, statement:str, backend:str=None) -> str:
+        """Cache key of a statement
+        :param transpiler: Transpiler of the dialect pair
+        :param statement: Statement without comments
+        :param backend: Parser backend name
+        :return: hexadecimal digest
+        """
+        rules = self._fingerprint(transpiler)
+        parts = [transpiler.from_dialect, transpiler.to_dialect, self.version, rules, statement.strip()]
+        # Keys of the default moz backend have no backend part
+        text = "\0".join(parts if backend in (None, "moz") else parts + [backend])
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _fingerprint(self, transpiler) -> str:
+        pair = (transpiler.from_dialect, transpiler.to_dialect)
+        if pair not in self._fingerprints:
+            self._fingerprints[pair] = rules_fingerprint(transpiler.dialect)
+        return self._fingerprints[pair]
+
+    def get(self, transpiler, statement:str, backend:str=None) -> list:
+        """Cached translation of a statement
+        :param transpiler: Transpiler of the dialect pair
+        :param statement: Statement without comments
+        :param backend: Parser backend name
+        :return: list with the SQL query and problems, as Transpiler.translate, or None if it is not cached
+        """
+        key = self.key(transpiler, statement, backend)
+        row = self.conn.execute("SELECT sql, problems FROM translations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used.append((time.time(), key))
+        self._commit()
+        return [row[0], json.loads(row[1])]
+
+    def put(self, transpiler, statement:str, translation:list, backend:str=None):
+        """Store the translation of a statement. Translations with problems that are not text are not stored.
+        :param transpiler: Transpiler of the dialect pair
+        :param statement: Statement without comments
+        :param translation: list with the SQL query and problems, as returned by Transpiler.translate
+        :param backend: Parser backend name
+        """
+        sql, problems = translation
+        if not all(isinstance(value, str) for problem in problems for value in problem.values()):
+            return
+        problems = json.dumps(problems)
+        size = len(statement) + len(sql) + len(problems)
+        self._rows.append((self.key(transpiler, statement, backend), f"{transpiler.from_dialect}-{transpiler.to_dialect}",
+                           self.version, self._fingerprint(transpiler), sql, problems, size, time.time()))
+        self._commit()
+
+    def _commit(self):
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        """Write the pending changes and evict the least recently used entries over max_bytes.
+        The changes are kept in memory until then, so the file is locked only while they are written."""
+        self._pending = 0
+        rows, used = self._rows, self._used
+        self._rows, self._used = list(), list()
+        self.conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.executemany("UPDATE translations SET used = ? WHERE key = ?", used)
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+        if total > self.max_bytes:
+            # Evict down to 90% of the limit
+            excess = total - int(self.max_bytes * 0.9)
+            self.conn.execute("""DELETE FROM translations WHERE key IN (
+                                 SELECT key FROM (SELECT key, size, SUM(size) OVER (ORDER BY used, key) AS running
+                                 FROM translations) WHERE running - size < ?)""", (excess,))
+        self.conn.commit()
+
+    def prune(self) -> int:
+        """Remove the entries of other package versions, of changed dialect rules and of unknown dialects, and compact the file
+        :return: number of removed entries
+        """
+        from dora_parser.transpiler import Transpiler
+        self.commit()
+        removed = self.conn.execute("DELETE FROM translations WHERE version != ?", (self.version,)).rowcount
+        for (pair,) in self.conn.execute("SELECT DISTINCT pair FROM translations").fetchall():
+            try:
+                rules = self._fingerprint(Transpiler(*pair.split("-", 1)))
+            except (ValueError, TypeError, ImportError):
+                removed += self.conn.execute("DELETE FROM translations WHERE pair = ?", (pair,)).rowcount
+                continue
+            removed += self.conn.execute("DELETE FROM translations WHERE pair = ? AND rules != ?", (pair, rules)).rowcount
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+        return removed
+
+    def info(self) -> dict:
+        """Cache statistics
+        :return: dictionary with hits, misses, number of entries and size in bytes
+        """
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations").fetchone()
+        return {"Hits": self.hits, "Misses": self.misses, "Entries": entries, "Bytes": size, "Max_bytes": self.max_bytes}
+
+    def close(self):
+        """Write the pending changes and close the file"""
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Statement Exporter Implementation
+
+One record is written per translated statement, as JSON lines or, when pyarrow is
+installed, as Parquet:
+
+    {"File": "a.sql", "Index": 0, "Offset": 0, "Kind": "parsed", "From_dialect": "impala",
+     "To_dialect": "spark", "Errors": [{"Type": "trunc", "Level": "MEDIUM"}], "Elapsed": 0.0012}
+"""
+import json
+from dora_parser.rules import NOT_ALLOWED, ALLOWED, REPLACED
+from dora_parser.passthrough import COPIED
+
+# Statement classification written as Kind
+KINDS = {NOT_ALLOWED: 'not_allowed', ALLOWED: 'parsed', REPLACED: 'replaced', None: 'other', COPIED: 'copied'}
+
+FORMATS = ['jsonl', 'parquet']
+
+def statement_record(f_name:str, index:int, offset:int, kind:str, problems:list, elapsed:float, from_dialect:str, to_dialect:str) -> dict:
+    """Create the export record of a statement
+    :param f_name: File name
+    :param index: Statement position in the file, starting at 0
+    :param offset: Byte offset of the statement in the file
+    :param kind: Statement kind returned by Reader.translate_statement
+    :param problems: Statement errors returned by Reader.translate_statement
+    :param elapsed: Translation time in seconds
+    :param from_dialect: From SQL dialect
+    :param to_dialect: To SQL dialect
+    :return: the record
+    """
+    errors = list()
+    for problem in problems or list():
+        key = next(iter(problem))
+        errors.append({"Type": key.lower(), "Level": str(problem[key]).split(":")[0]})
+    return {"File": f_name, "Index": index, "Offset": offset, "Kind": KINDS.get(kind, kind),
+            "From_dialect": from_dialect, "To_dialect": to_dialect, "Errors": errors, "Elapsed": round(elapsed, 6)}
+
+class RecordBuffer():
+    """Records kept in memory, used by the pool processes to send them back with each file"""
+
+    def __init__(self):
+        self.records = list()
+
+    def write(self, record:dict):
+        self.records.append(record)
+
+    def drain(self) -> list:
+        """Return the buffered records and empty the buffer"""
+        records, self.records = self.records, list()
+        return records
+
+class StatementExporter():
+    """Writer of statement records, the format is chosen by the file suffix"""
+
+    def __init__(self, path:str, batch_size:int=10000):
+        """Initialize the exporter class
+        :param path: Output file, a .parquet suffix writes Parquet, any other JSON lines
+        :param batch_size: Number of records per Parquet row group
+        """
+        self.path = path
+        self.format = 'parquet' if str(path).lower().endswith('.parquet') else 'jsonl'
+        self.batch_size = batch_size
+        self.n_records = 0
+        self._batch = list()
+        self._writer = None
+        if self.format == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("--EXPORT:Parquet requires pyarrow, install it or use a .jsonl file") from None
+            self._pa = pyarrow
+            self._writer = pyarrow.parquet.ParquetWriter(path, self.schema(pyarrow))
+        else:
+            self._file = open(path, "w")
+
+    @classmethod
+    def schema(cls, pa):
+        """Parquet schema of the records
+        :param pa: pyarrow module
+        """
+        error = pa.struct([("Type", pa.string()), ("Level", pa.string())])
+        return pa.schema([("File", pa.string()), ("Index", pa.int64()), ("Offset", pa.int64()), ("Kind", pa.string()),
+                          ("From_dialect", pa.string()), ("To_dialect", pa.string()),
+                          ("Errors", pa.list_(error)), ("Elapsed", pa.float64())])
+
+    def write(self, record:dict):
+        """Write a record
+        :param record: Record created by statement_record
+        """
+        self.n_records += 1
+        if self._writer is None:
+            self._file.write(json.dumps(record) + "\n")
+            return
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def write_many(self, records:list):
+        """Write a list of records"""
+        for record in records:
+            self.write(record)
+
+    def _flush(self):
+        if self._batch:
+            self._writer.write_table(self._pa.Table.from_pylist(self._batch, schema=self._writer.schema))
+            self._batch = list()
+
+    def close(self):
+        """Write the remaining records and close the file"""
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Query Fingerprint Implementation
+
+Statements that only differ in their literals share a template, where each literal
+is replaced by a __dora_lit_N__ placeholder. Each template is parsed and translated
+once, and the literals of the next statements are bound back into its translation.
+
+Literals that a dialect rewrite may depend on are kept in the template: arguments of
+the dialect functions (as the TRUNC units) and literals after other keywords (as
+INTERVAL or DATE). So are the literals the formatter rewrites, as 1.50 or 007. The first statement of each template is also translated in full
+and the template is only reused when binding its literals gives the same result;
+otherwise, and whenever the placeholders are not found once each, the statements
+are translated in full.
+"""
+import re
+from hashlib import blake2b
+from dora_parser.cache import LRUCache
+from dora_parser.parser import Parser
+from dora_parser.splitter import StatementSplitter
+from dora_parser import profiler
+
+PLACEHOLDER = re.compile(r"__dora_lit_(\d+)__")
+
+_TOKENS = re.compile(r"""(?P<string>'(?:[^'\\]|\\.|'')*')|(?P<quoted>"(?:[^"\\]|\\.)*"|`[^`]*`)"""
+                     r"""|(?P<name>[A-Za-z_][A-Za-z0-9_$]*)|(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)"""
+                     r"""|(?P<open>\()|(?P<close>\))|(?P<other>[^\s'"`A-Za-z0-9_()]+)""", re.DOTALL)
+
+# Literals written back as they are by the formatter, others are kept in the template
+_CANONICAL = re.compile(r"0|[1-9][0-9]*|'[^\\]*'")
+
+# Keywords that may precede a literal replaced by a placeholder
+KEYWORDS = {'SELECT', 'WHERE', 'AND', 'OR', 'ON', 'HAVING', 'WHEN', 'THEN', 'ELSE', 'LIKE'}
+# Dialect words whose arguments may be replaced by placeholders
+LISTS = {'IN'}
+
+# Template that can not be reused
+_FULL = object()
+
+class TemplateTranslator():
+    """Translator of statements through their literal free templates"""
+
+    def __init__(self, transpiler, cache_size:int=4096, timeout:float=None, backend:str=None):
+        """Initialize the template translator class
+        :param transpiler: Transpiler of the dialect pair
+        :param cache_size: Number of translated templates kept
+        :param timeout: Optional time limit to parse each statement, in seconds
+        :param backend: Parser backend name
+        """
+        self.transpiler = transpiler
+        self.timeout = timeout
+        self.backend = backend
+        self.templates = LRUCache(cache_size)
+        # Digest of each distinct template, stable across processes
+        self.seen = set()
+        self._new = list()
+        self.n_queries = 0
+        self.n_reused = 0
+        self.n_full = 0
+
+    def fingerprint(self, query:str) -> tuple:
+        """Replace the literals of a query without comments by placeholders
+        :param query: SQL query without comments
+        :return: template + list of literals, or None + None if the query can not be templated
+        """
+        if "__dora_lit_" in query:
+            return None, None
+        words = self.transpiler.dispatch
+        pieces = list()
+        literals = list()
+        # True for each open parenthesis whose literals are kept
+        stack = list()
+        previous = None
+        last = 0
+        for token in _TOKENS.finditer(query):
+            start, end = token.span()
+            if query[last:start].strip():
+                # Unterminated quote
+                return None, None
+            kind = token.lastgroup
+            if kind == 'open':
+                name = previous.group().upper() if previous is not None and previous.lastgroup == 'name' else None
+                stack.append(bool(stack and stack[-1]) or (name in words and name not in LISTS))
+            elif kind == 'close':
+                stack.pop() if stack else None
+            elif kind in ('string', 'number'):
+                after_keyword = previous is not None and previous.lastgroup == 'name' and previous.group().upper() not in KEYWORDS
+                if not (stack and stack[-1]) and not after_keyword and _CANONICAL.fullmatch(token.group()):
+                    pieces.append(query[last:start] + f"__dora_lit_{len(literals)}__")
+                    literals.append(token.group())
+                    last = end
+                    previous = token
+                    continue
+            pieces.append(query[last:end])
+            last = end
+            previous = token
+        pieces.append(query[last:])
+        return "".join(pieces), literals
+
+    @classmethod
+    def bind(cls, translation:list, literals:list) -> list:
+        """Replace the placeholders of a translated template by the literals
+        :param translation: SQL query + problems of the template
+        :param literals: Literals of the statement
+        :return: SQL query + problems of the statement, None if a placeholder is missing or repeated
+        """
+        sql, problems = translation
+        found = sorted(int(n) for n in PLACEHOLDER.findall(sql))
+        if found != list(range(len(literals))):
+            return None
+        replace = lambda match: literals[int(match.group(1))]
+        bound = list()
+        for problem in problems:
+            if not all(isinstance(value, str) for value in problem.values()):
+                return None
+            bound.append({key: PLACEHOLDER.sub(replace, value) for key, value in problem.items()})
+        return [PLACEHOLDER.sub(replace, sql), bound]
+
+    def translate(self, query:str, clean:bool=False) -> list:
+        """Translate a query, reusing the translation of its template
+        :param query: SQL query
+        :param clean: If true, removes the comments first
+        :return: list with two values: SQL query and problems, as Transpiler.translate
+        """
+        if clean:
+            query = StatementSplitter.strip_comments(query)
+        self.n_queries += 1
+        with profiler.active().stage("fingerprint"):
+            template, literals = self.fingerprint(query)
+        if not literals:
+            self.n_full += 1
+            return self.transpiler.translate(Parser(query, clean=False, timeout=self.timeout, backend=self.backend))
+        digest = blake2b(template.encode('utf-8'), digest_size=8).digest()
+        if digest not in self.seen:
+            self.seen.add(digest)
+            self._new.append(digest)
+        cached = self.templates.get(template)
+        if cached is not None and cached is not _FULL:
+            if (bound := self.bind(cached, literals)) is not None:
+                self.n_reused += 1
+                return bound
+        self.n_full += 1
+        result = self.transpiler.translate(Parser(query, clean=False, timeout=self.timeout, backend=self.backend))
+        if cached is None:
+            try:
+                translation = self.transpiler.translate(Parser(template, clean=False, timeout=self.timeout, backend=self.backend))
+                safe = self.bind(translation, literals) == result
+            except Exception:
+                safe = False
+            self.templates.put(template, translation if safe else _FULL)
+        return result
+
+    def stats(self) -> dict:
+        """Number of statements, distinct templates, statements translated from a template and in full"""
+        return {"Queries": self.n_queries, "Templates": len(self.seen), "Reused": self.n_reused, "Full": self.n_full}
+
+    def drain(self) -> dict:
+        """Counters and new templates since the last drain, sent back by the pool processes
+        :return: dictionary for merge
+        """
+        delta = {"Queries": self.n_queries, "Reused": self.n_reused, "Full": self.n_full, "Templates": self._new}
+        self.n_queries = self.n_reused = self.n_full = 0
+        self._new = list()
+        return delta
+
+    def merge(self, delta:dict):
+        """Add the counters and templates drained in another process
+        :param delta: Dictionary returned by drain
+        """
+        self.n_queries += delta["Queries"]
+        self.n_reused += delta["Reused"]
+        self.n_full += delta["Full"]
+        self.seen.update(delta["Templates"])
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Manifest Class Implementation"""
+import hashlib
+import json
+import os
+from dora_parser import __version__, logger
+
+MANIFEST_NAME = '.dora_manifest.json'
+
+class Manifest():
+    """Record of the files translated in an output directory, used to skip unchanged files"""
+
+    def __init__(self, output_dir:str, from_dialect:str, to_dialect:str, options:dict=None):
+        """Initialize the manifest class, loading the previous manifest if there is one
+        :param output_dir: Output Directory
+        :param from_dialect: From SQL dialect
+        :param to_dialect: To SQL dialect
+        :param options: Reader options that change the translated files or their summaries, a file translated with
+            other options is translated again
+        """
+        self.output_dir = output_dir
+        self.from_dialect = from_dialect
+        self.to_dialect = to_dialect
+        self.options = dict() if options is None else options
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = dict()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f: self.entries = json.load(f).get("Files", dict())
+            except (ValueError, OSError) as err:
+                logger.warning("Manifest ignored:\n--MANIFEST:%s", err)
+
+    @classmethod
+    def file_hash(cls, path:str, archive=None) -> str:
+        """Hash the file content
+        :param path: File path, or member path of the archive
+        :param archive: Optional SQLArchive holding the file
+        :return: sha256 hex digest
+        """
+        digest = hashlib.sha256()
+        with (open(path, "rb") if archive is None else archive.open_binary(path)) as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, f_name:str, f_hash:str) -> list:
+        """Find the summary of a file translated before with the same content, dialects, options and version
+        :param f_name: File name
+        :param f_hash: Hash of the current file content
+        :return: The file summary, or None if the file must be translated
+        """
+        entry = self.entries.get(f_name)
+        if entry is None:
+            return None
+        if (entry.get("Hash"), entry.get("From_dialect"), entry.get("To_dialect"), entry.get("Version")) != \
+                (f_hash, self.from_dialect, self.to_dialect, __version__):
+            return None
+        if entry.get("Options", dict()) != self.options:
+            return None
+        if not os.path.exists(os.path.join(self.output_dir, entry.get("Location", ""), f_name)):
+            return None
+        return entry.get("Summary")
+
+    def location(self, f_name:str) -> str:
+        """Output folder recorded for a file
+        :param f_name: File name
+        :return: "Fully Translated", "Partially Translated" or None
+        """
+        return self.entries.get(f_name, dict()).get("Location")
+
+    def update(self, f_name:str, f_hash:str, location:str, summary:list):
+        """Record the translation of a file
+        :param f_name: File name
+        :param f_hash: Hash of the file content
+        :param location: Output folder of the translated file
+        :param summary: The file summary
+        """
+        self.entries[f_name] = {"Hash": f_hash, "From_dialect": self.from_dialect, "To_dialect": self.to_dialect,
+                                "Version": __version__, "Options": self.options, "Location": location, "Summary": summary}
+
+    def save(self, f_names:list=None):
+        """Write the manifest to the output directory
+        :param f_names: If given, only these files are kept, dropping the ones removed from the input
+        """
+        if f_names is not None:
+            self.entries = {f_name: self.entries[f_name] for f_name in f_names if f_name in self.entries}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"Version": __version__, "Files": self.entries}, f)
+        os.replace(tmp_path, self.path)
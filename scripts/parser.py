@@ -15,31 +15,89 @@
 # limitations under the License.
 #
 """Parser Implementation"""
-import re
-from mo_sql_parsing import parse as moz_parser
-from mo_parsing.exceptions import ParseException
-from dora_parser import logger
+import os
+from dora_parser.backends import ParserError, load_backend
+from dora_parser.cache import LRUCache
+from dora_parser.splitter import StatementSplitter
+from dora_parser.watchdog import ParseWatchdog, ParseTimeout
+from dora_parser import logger, profiler
 
 class Parser():
     """Parser Object"""
+    # Parse trees shared by every Parser, keyed by the cleaned query
+    cache = LRUCache(maxsize=int(os.environ.get('DORA_PARSER_CACHE_SIZE', 1024)))
+    # Parse process of the statements with a time limit of each backend, started on first use
+    _watchdogs = dict()
+
+    @classmethod
+    def watchdog(cls, timeout:float, backend:str=None) -> ParseWatchdog:
+        """Parse process shared by every Parser with a time limit
+        :param timeout: Time limit of each statement, in seconds
+        :param backend: Parser backend name
+        :return: the ParseWatchdog
+        """
+        if backend not in cls._watchdogs:
+            cls._watchdogs[backend] = ParseWatchdog(timeout, backend)
+        cls._watchdogs[backend].timeout = float(timeout)
+        return cls._watchdogs[backend]
+
+    @classmethod
+    def cache_info(cls) -> dict:
+        """Parse tree cache statistics
+        :return: dictionary with hits, misses, evictions, size and maxsize
+        """
+        return cls.cache.info()
+
+    @classmethod
+    def set_cache_size(cls, maxsize:int):
+        """Change the parse tree cache capacity
+        :param maxsize: Maximum number of cached trees, 0 disables the cache
+        """
+        cls.cache.resize(maxsize)
 
     @classmethod
     def clean(cls, query) -> str:
         """Remove query comments and line breaks
         :return: clean sql query
         """
-        return re.sub(r'(--.*?\n)|(/\*(.|\n)*?\*/)', '', query)
+        return StatementSplitter.strip_comments(query)
 
-    def __init__(self,query:str):
+    def __init__(self,query:str, cache:bool=True, clean:bool=True, timeout:float=None, backend:str=None):
         """Initialize the parser class
         :param query: sql query that will be translate
+        :param cache: If true, reuses the tree of an identical query parsed before
+        :param clean: If false, the query is already free of comments
+        :param timeout: Optional time limit in seconds, the query is then parsed in a separate process
+        :param backend: Parser backend name, see dora_parser.backends. The DORA_PARSER_BACKEND variable or moz if None
+        :raises ParserError: if the query can not be parsed
+        :raises ParseTimeout: if the query is not parsed within the time limit
         """
-        self.query =  Parser.clean(query)
-        try:
-            self.tree = moz_parser(self.query)
-        except ParseException as err:
-            logger.error("Query not supported:\n--PARSER:%s",err)
-            raise err
+        prof = profiler.active()
+        with prof.stage("clean"):
+            self.query =  Parser.clean(query) if clean else query
+        _backend = load_backend(backend)
+        self.backend = _backend.name
+        _key = (self.backend, self.query.strip())
+        _tree = Parser.cache.get(_key) if cache else None
+        if _tree is None:
+            try:
+                with prof.stage("parse"):
+                    if timeout is None:
+                        _tree = _backend.parse(self.query)
+                    else:
+                        _tree = Parser.watchdog(timeout, self.backend).parse(self.query)
+            except _backend.errors as err:
+                logger.error("Query not supported:\n--PARSER:%s",err)
+                raise ParserError(str(err), self.query, self.backend) from err
+            except ParseTimeout:
+                raise
+            except ParserError as err:
+                logger.error("Query not supported:\n--PARSER:%s",err)
+                raise
+            if cache:
+                Parser.cache.put(_key, _tree)
+        # Transpiler.resolve builds a new tree, so the cached one can be shared
+        self.tree = _tree
 
     def __repr__(self) -> repr:
         """Sql query is parsed with moz_sql_parser
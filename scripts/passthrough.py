@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Pass-Through Implementation
+
+Statements without any word the target dialect rewrites are valid in the target as they
+are, so they can be copied to the output without being parsed. The statement words are
+checked against the dialect words, with the operators the parser turns into dialect
+words (as || into CONCAT) and the quoted identifiers, which each dialect formats in its
+own way. Checked statements are not formatted, so their text is kept as it was written.
+
+A sample of the copied statements is also translated in full. When the translation
+changes the statement or reports errors, the full translation is used and the statement
+is counted as mismatched, so the sample tells how reliable the copies are.
+
+Copied statements are not checked by the grammar either: a statement the parser rejects,
+as one with ILIKE or IS DISTINCT FROM, is copied instead of being reported with a parser
+error. The statements copied without being verified have the COPIED kind and are counted
+as Copied in the file summary, apart from Success, so the migration report still shows
+how many statements were not parsed.
+"""
+import re
+from hashlib import blake2b
+from dora_parser import logger
+
+_TOKENS = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\|\||::|[%/\"`]")
+
+# Operators parsed to a dialect word
+OPERATORS = {'||': 'CONCAT', '%': 'MOD', '/': 'DIV', '::': 'CAST', 'IS': 'EXISTS', 'REGEXP': 'RLIKE'}
+# Kind of the statements copied without being verified, see Reader.translate_statement
+COPIED = 'copied'
+# Words always translated in full: quoted identifiers and literals the parser normalizes
+ALWAYS_PARSE = {'"', '`', 'INTERVAL'}
+
+class PassThrough():
+    """Copies the statements without dialect words to the output, checking a sample of them"""
+
+    def __init__(self, transpiler, verify:float=0.0):
+        """Initialize the pass-through class
+        :param transpiler: Transpiler of the dialect pair
+        :param verify: Fraction of the copied statements also translated in full, from 0 to 1
+        """
+        if not 0 <= float(verify) <= 1:
+            raise ValueError("verify must be between 0 and 1")
+        self.transpiler = transpiler
+        self.verify = float(verify)
+        self.words = frozenset(transpiler.dispatch) | ALWAYS_PARSE
+        self.n_queries = 0
+        self.n_copied = 0
+        self.n_verified = 0
+        self.n_mismatched = 0
+
+    def scan(self, query:str) -> bool:
+        """Check whether a statement can be copied as it is
+        :param query: SQL statement without comments
+        :return: True if no word of the statement is rewritten by the dialect
+        """
+        words = self.words
+        for token in _TOKENS.findall(query):
+            token = token.upper()
+            if token in words or OPERATORS.get(token) in words:
+                return False
+        return True
+
+    def sampled(self, query:str) -> bool:
+        """Whether a statement is verified, the same statements are sampled by every run and process"""
+        if self.verify <= 0:
+            return False
+        digest = int.from_bytes(blake2b(query.encode("utf-8"), digest_size=8).digest(), "big")
+        return digest < self.verify * 2 ** 64
+
+    def translate(self, query:str, parse) -> list:
+        """Copy a statement without dialect words
+        :param query: SQL statement without comments, ended by its semicolon
+        :param parse: Function returning the Parser of the statement, called for the verified statements
+        :return: list with the SQL query and problems, as Transpiler.translate, or None if the statement must be translated
+        """
+        self.n_queries += 1
+        if not self.scan(query):
+            return None
+        sql = query.rstrip()
+        sql = sql[:-1].rstrip() if sql.endswith(";") else sql
+        if self.sampled(query):
+            self.n_verified += 1
+            _parser = parse()
+            changed = self.transpiler.resolve(_parser.tree) != _parser.tree
+            translation = self.transpiler.translate(_parser)
+            if changed or translation[1]:
+                self.n_mismatched += 1
+                logger.warning("--PASSTHROUGH:MISMATCH:%s", query)
+                return translation
+        self.n_copied += 1
+        return [sql, list()]
+
+    def stats(self) -> dict:
+        """Number of statements, statements copied, verified and verified with a different translation"""
+        return {"Queries": self.n_queries, "Copied": self.n_copied, "Verified": self.n_verified,
+                "Mismatched": self.n_mismatched}
+
+    def drain(self) -> dict:
+        """Counters since the last drain, sent back by the pool processes
+        :return: dictionary for merge
+        """
+        delta = self.stats()
+        self.n_queries = self.n_copied = self.n_verified = self.n_mismatched = 0
+        return delta
+
+    def merge(self, delta:dict):
+        """Add the counters drained in another process
+        :param delta: Dictionary returned by drain
+        """
+        self.n_queries += delta["Queries"]
+        self.n_copied += delta["Copied"]
+        self.n_verified += delta["Verified"]
+        self.n_mismatched += delta["Mismatched"]
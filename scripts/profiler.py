@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Profiler Implementation
+
+The translation stages are timed through the active profiler. By default it is a
+NullProfiler, whose methods do nothing, so the instrumentation costs a function call.
+"""
+import heapq
+import json
+from itertools import count
+from time import perf_counter
+
+class _NullStage():
+    """Context manager that does nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class NullProfiler():
+    """Disabled profiler"""
+    enabled = False
+    current_file = None
+
+    def stage(self, name:str):
+        return _NULL_STAGE
+
+    def add(self, name:str, seconds:float, n:int=1):
+        pass
+
+    def statement(self, seconds:float, query:str):
+        pass
+
+    def file(self, f_name:str, seconds:float):
+        pass
+
+class _Stage():
+    """Context manager that adds its elapsed time to a profiler stage"""
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name:str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add(self.name, perf_counter() - self.start)
+        return False
+
+class Profiler():
+    """Cumulative time and count of each stage, time of each file and slowest statements"""
+    enabled = True
+
+    def __init__(self, top:int=20):
+        """Initialize the profiler class
+        :param top: Number of slowest statements kept
+        """
+        self.top = top
+        self.current_file = None
+        self.stages = dict()
+        self.files = dict()
+        self._slowest = list()
+        self._order = count()
+
+    def stage(self, name:str) -> _Stage:
+        """Time the block as the given stage
+        :param name: Stage name
+        """
+        return _Stage(self, name)
+
+    def add(self, name:str, seconds:float, n:int=1):
+        """Add time to a stage
+        :param name: Stage name
+        :param seconds: Elapsed time
+        :param n: Number of calls
+        """
+        stage = self.stages.setdefault(name, [0, 0.0])
+        stage[0] += n
+        stage[1] += seconds
+
+    def statement(self, seconds:float, query:str):
+        """Record the time of a statement of the current file, keeping the slowest ones
+        :param seconds: Elapsed time
+        :param query: Statement text
+        """
+        item = (seconds, next(self._order), self.current_file, query)
+        if len(self._slowest) < self.top:
+            heapq.heappush(self._slowest, item)
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def file(self, f_name:str, seconds:float):
+        """Record the time of a file
+        :param f_name: File name
+        :param seconds: Elapsed time
+        """
+        self.files[f_name] = seconds
+
+    def merge(self, profile:dict):
+        """Add a profile produced by another process
+        :param profile: Dictionary returned by to_dict
+        """
+        for name, stage in profile["Stages"].items():
+            self.add(name, stage["Seconds"], stage["Count"])
+        self.files.update(profile["Files"])
+        for item in profile["Slowest"]:
+            self.current_file = item["File"]
+            self.statement(item["Seconds"], item["Statement"])
+        self.current_file = None
+
+    def to_dict(self) -> dict:
+        """Profile as a dictionary
+        :return: stages, files and slowest statements
+        """
+        return {
+            "Stages": {name: {"Count": n, "Seconds": round(seconds, 6)} for name, (n, seconds) in self.stages.items()},
+            "Files": {f_name: round(seconds, 6) for f_name, seconds in self.files.items()},
+            "Slowest": [{"Seconds": round(seconds, 6), "File": f_name, "Statement": query}
+                        for seconds, _, f_name, query in sorted(self._slowest, reverse=True)],
+        }
+
+    def save(self, path:str):
+        """Write the profile as JSON
+        :param path: Output file
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+_active = NullProfiler()
+
+def active():
+    """Profiler used by the translation stages"""
+    return _active
+
+def enable(top:int=20) -> Profiler:
+    """Start profiling, replacing the active profiler
+    :param top: Number of slowest statements kept
+    :return: the new Profiler
+    """
+    global _active
+    _active = Profiler(top)
+    return _active
+
+def disable():
+    """Stop profiling"""
+    global _active
+    _active = NullProfiler()
@@ -15,92 +15,482 @@
 # limitations under the License.
 """Reader Class Implementation"""
 
-from dora_parser.dialects.athena import Athena
-from dora_parser.dialects.spark import Spark
-from dora_parser.parser import Parser
+from dora_parser.parser import Parser, ParserError, ParseTimeout
+from dora_parser.splitter import StatementSplitter
 from dora_parser.transpiler import Transpiler
-from mo_parsing.exceptions import ParseException
-from dora_parser.report import Report
+from dora_parser.rules import RuleEngine, get_rules, NOT_ALLOWED, ALLOWED, REPLACED
+from dora_parser.manifest import Manifest, MANIFEST_NAME
+from dora_parser.registry import TRANSLATIONS, DIALECTS
+from dora_parser.export import StatementExporter, RecordBuffer, statement_record
+from dora_parser.fingerprint import TemplateTranslator
+from dora_parser.summary import SummaryAggregator
+from dora_parser.cache import TranslationCache
+from dora_parser.passthrough import PassThrough, COPIED
+from dora_parser.backends import load_backend
+from dora_parser.archive import SQLArchive
+from dora_parser import profiler
 from dora_parser import logger
-from collections import Counter
-import re
+from collections import Counter, deque
+from time import perf_counter
 import os
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from fnmatch import fnmatch
+from itertools import islice
 
-SUPPORTED_DIALECTS = ['impala-spark','impala-athena']
+SUPPORTED_DIALECTS = TRANSLATIONS
+# Suffix of the files being written by translate_file
+TMP_SUFFIX = '.dora.tmp'
+
+# Reader owned by each process of the translate_files pool
+_WORKER_READER = None
+
+def _init_worker(options:dict, profile:int=0, export:bool=False):
+    """Create the worker reader once per process, with a warm transpiler and dialect
+    :param options: Reader arguments, as returned by Reader.worker_options
+    :param profile: Number of slowest statements to profile, 0 disables profiling
+    :param export: If true, the statement records are buffered and sent back with each file
+    """
+    global _WORKER_READER
+    profiler.enable(profile) if profile else profiler.disable()
+    _WORKER_READER = Reader(**options)
+    _WORKER_READER.exporter = RecordBuffer() if export else None
+    for reader in _WORKER_READER.readers.values():
+        reader.transpiler
+        reader.rules
+
+def _translate_file_worker(args:tuple)->tuple:
+    """Translate one file inside a pool process
+    :param args: file path, folders of each target and path relative to the input directory
+    :return: results of each target + file profile + file statement records + file counters, see Reader.drain_counters
+    """
+    results = _WORKER_READER.translate_targets(*args)
+    exporter = _WORKER_READER.exporter
+    records = exporter.drain() if exporter is not None else None
+    counters = _WORKER_READER.drain_counters()
+    prof = profiler.active()
+    if not prof.enabled:
+        return results, None, records, counters
+    # Each file profile is sent back and merged by the parent process
+    profiler.enable(prof.top)
+    return results, prof.to_dict(), records, counters
+
+def _translate_statements(args:tuple)->tuple:
+    """Translate a chunk of statements of a script inside a pool process
+    :param args: target dialects and statements
+    :return: results of each statement, see Reader.translate_each + chunk profile + chunk counters
+    """
+    targets, queries = args
+    results = [_WORKER_READER.translate_each(query, targets) for query in queries]
+    translations = _WORKER_READER._translations
+    translations.commit() if translations is not None else None
+    counters = _WORKER_READER.drain_counters()
+    prof = profiler.active()
+    if not prof.enabled:
+        return results, None, counters
+    profiler.enable(prof.top)
+    return results, prof.to_dict(), counters
+
+def _patterns(patterns) -> list:
+    """Glob patterns as a list
+    :param patterns: None, a comma separated string or a list of patterns
+    """
+    if patterns is None:
+        return list()
+    if isinstance(patterns, str):
+        patterns = patterns.split(",")
+    return [pattern.strip() for pattern in patterns if pattern.strip()]
+
+def _timed(prof, statements):
+    """Add the time spent splitting the statements to the profiler
+    :param prof: Active profiler
+    :param statements: Statement iterator
+    """
+    statements = iter(statements)
+    while True:
+        start = perf_counter()
+        try:
+            query = next(statements)
+        except StopIteration:
+            prof.add("split", perf_counter() - start)
+            return
+        prof.add("split", perf_counter() - start)
+        yield query
 
 class Reader():
 
-    def __init__(self, from_dialect:str, to_dialect:str, input_dir:str=None, output_dir:str = None, migration_report:bool = False):
+    def __init__(self, from_dialect:str, to_dialect:str, input_dir:str=None, output_dir:str = None, migration_report:bool = False, workers:int = 1, incremental:bool = False, report_backend:str = 'html', export:str = None, fingerprint:bool = False, parse_timeout:float = None, summary_store:str = None, translation_cache:str = None, statement_chunksize:int = None, passthrough:bool = False, verify_passthrough:float = 0.0, parser_backend:str = None, recursive:bool = False, include:list = None, exclude:list = None, encoding:str = None):
         """Initialize the reader class
         :param from_dialect: From SQL dialect
-        :param to_dialect: To SQL dialect
-        :param input_dir: Input Directory
-        :param output_dir: Output Directory
+        :param to_dialect: To SQL dialect, or a list or comma separated target dialects. Each statement is then parsed
+            once and translated to every target, written under a folder of the output directory named after the target
+        :param input_dir: Input Directory, or a zip or tar archive read without extracting it, see dora_parser.archive
+        :param output_dir: Output Directory. The input directory, or the folder of the input archive, if None
         :param migration_report: If true, creates the migration report
+        :param workers: Number of processes used to translate the input directory files
+        :param incremental: If true, skips the files unchanged since the last run over the same output directory
+        :param report_backend: Migration report backend, "html", "paginated" or "pandas"
+        :param export: Optional file where translate_files writes one record per statement, JSON lines or .parquet
+        :param fingerprint: If true, statements that only differ in their literals are translated through a shared template
+        :param parse_timeout: Optional time limit to parse each statement, in seconds. The statements are then parsed
+            in a separate process, restarted when a statement takes longer
+        :param summary_store: Optional JSON lines file where translate_files writes the per-file summaries instead of
+            keeping them in memory, the summary Files are then read back from it
+        :param translation_cache: Optional SQLite file with the translated statements, shared by runs and processes
+        :param statement_chunksize: With more than one worker, the statements of each script are sent to the pool in
+            chunks of this size and put back in order, instead of one file per process. Use it for a few huge scripts
+        :param passthrough: If true, statements without any word rewritten by the target dialect are copied without
+            being parsed, see dora_parser.passthrough. Statements the parser would reject are then copied too, they are
+            counted as Copied in the file summaries instead of Success or Failed
+        :param verify_passthrough: Fraction of the copied statements also translated in full to check them, from 0 to 1
+        :param parser_backend: Parser backend name, see dora_parser.backends
+        :param recursive: If true, translate_files also translates the files of the input subdirectories, keeping
+            their relative paths under the output folders. The outputs of the runs inside the input directory are skipped
+        :param include: Glob patterns, as "*.sql", of the paths relative to the input directory to translate, or a
+            comma separated string of them. Every file if None
+        :param exclude: Glob patterns of the paths relative to the input directory to skip
+        :param encoding: Encoding of the input files. The locale encoding for files and utf-8 for archive members if None
         """
         self.from_dialect = str(from_dialect).lower()
-        self.to_dialect = str(to_dialect).lower()
-        if self.from_dialect not in ['impala'] or self.to_dialect not in ['spark','athena']:
-            raise ValueError(f"Only the following dialects are supported:{SUPPORTED_DIALECTS}")
+        targets = to_dialect.split(",") if isinstance(to_dialect, str) else to_dialect
+        self.targets = tuple(dict.fromkeys(str(target).strip().lower() for target in targets))
+        self.to_dialect = ",".join(self.targets)
+        for target in self.targets:
+            if f"{self.from_dialect}-{target}" not in TRANSLATIONS:
+                raise ValueError(f"Only the following dialects are supported:{TRANSLATIONS}")
         self.input_dir =  input_dir
+        self.from_archive = SQLArchive.is_archive(input_dir)
+        if output_dir is None and self.from_archive:
+            output_dir = os.path.join(os.path.dirname(os.path.abspath(input_dir)), "")
         self.output_dir = self.input_dir if output_dir is None else output_dir
         self.migration_report = migration_report
+        self.workers = max(int(workers or 1), 1)
+        self.incremental = incremental
+        self.report_backend = report_backend
+        self.export = export
+        # Receives the statement records while translate_files runs with export
+        self.exporter = None
+        self.fingerprint = fingerprint
+        self.parse_timeout = parse_timeout
+        self.summary_store = summary_store
+        self.translation_cache = translation_cache
+        self._translations = None
+        self.statement_chunksize = int(statement_chunksize) if statement_chunksize else None
+        self._pool = None
+        self.passthrough = passthrough
+        self.verify_passthrough = verify_passthrough
+        self._pass_through = None
+        self.parser_backend = parser_backend
+        self.recursive = recursive
+        self.include = _patterns(include)
+        self.exclude = _patterns(exclude)
+        self.encoding = encoding
+        self._archive = None
+        self._transpiler = None
+        self._templates = None
+        self._readers = None
+        # Statements of the last translate_script copied without being parsed, of each target
+        self.copied = dict()
+
+    @property
+    def transpiler(self) -> Transpiler:
+        """Transpiler shared by every script translated by this reader"""
+        if self._transpiler is None:
+            self._transpiler = Transpiler(from_dialect=self.from_dialect, to_dialect=self.to_dialect)
+        return self._transpiler
+
+    @property
+    def archive(self) -> SQLArchive:
+        """Input archive, opened on first use"""
+        if self._archive is None and self.from_archive:
+            self._archive = SQLArchive(self.input_dir, self.encoding)
+        return self._archive
+
+    @property
+    def templates(self) -> TemplateTranslator:
+        """Template translator used when fingerprint is set"""
+        if self._templates is None:
+            self._templates = TemplateTranslator(self.transpiler, timeout=self.parse_timeout, backend=self.parser_backend)
+        return self._templates
+
+    @property
+    def pass_through(self) -> PassThrough:
+        """Copier of the statements without dialect words, used when passthrough is set"""
+        if self._pass_through is None:
+            self._pass_through = PassThrough(self.transpiler, self.verify_passthrough)
+        return self._pass_through
+
+    def drain_counters(self) -> dict:
+        """Template and pass-through counters of each target since the last drain, sent back by the pool processes
+        :return: dictionary for merge_counters, None if there are no counters
+        """
+        if not self.fingerprint and not self.passthrough:
+            return None
+        return {target: {"Templates": reader.templates.drain() if self.fingerprint else None,
+                         "Passthrough": reader.pass_through.drain() if self.passthrough else None}
+                for target, reader in self.readers.items()}
+
+    def merge_counters(self, counters:dict):
+        """Add the counters drained in another process
+        :param counters: Dictionary returned by drain_counters
+        """
+        for target, delta in counters.items():
+            reader = self.readers[target]
+            reader.templates.merge(delta["Templates"]) if delta["Templates"] is not None else None
+            reader.pass_through.merge(delta["Passthrough"]) if delta["Passthrough"] is not None else None
+
+    @property
+    def translations(self) -> TranslationCache:
+        """Persistent cache of translated statements, opened on first use"""
+        if self._translations is None:
+            self._translations = TranslationCache(self.translation_cache)
+        return self._translations
+
+    @property
+    def readers(self) -> dict:
+        """Reader of each target dialect, the reader itself when it has a single target"""
+        if self._readers is None:
+            if len(self.targets) == 1:
+                self._readers = {self.to_dialect: self}
+                return self._readers
+            self._readers = dict()
+            for target in self.targets:
+                store = None
+                if self.summary_store is not None:
+                    root, ext = os.path.splitext(self.summary_store)
+                    store = f"{root}.{target}{ext}"
+                output_dir = os.path.join(self.output_dir, target) if self.output_dir is not None else None
+                reader = Reader(self.from_dialect, target, self.input_dir, output_dir, self.migration_report,
+                                report_backend=self.report_backend, fingerprint=self.fingerprint,
+                                parse_timeout=self.parse_timeout, summary_store=store,
+                                translation_cache=self.translation_cache, passthrough=self.passthrough,
+                                verify_passthrough=self.verify_passthrough, parser_backend=self.parser_backend)
+                # The cache file is written through a single connection
+                reader._translations = self.translations if self.translation_cache is not None else None
+                self._readers[target] = reader
+        return self._readers
+
+    def worker_options(self) -> dict:
+        """Arguments of the reader created by each translate_files pool process"""
+        return {"from_dialect": self.from_dialect, "to_dialect": self.to_dialect, "input_dir": self.input_dir,
+                "output_dir": self.output_dir, "fingerprint": self.fingerprint, "parse_timeout": self.parse_timeout,
+                "translation_cache": self.translation_cache, "passthrough": self.passthrough,
+                "verify_passthrough": self.verify_passthrough, "parser_backend": self.parser_backend,
+                "encoding": self.encoding}
+
+    def manifest_options(self) -> dict:
+        """Options recorded by the incremental manifest, the files translated with other values are translated again"""
+        options = dict()
+        if self.passthrough:
+            # Copied statements change the outputs and add Copied to the summaries
+            options["Passthrough"] = True
+            options["Verify_passthrough"] = float(self.verify_passthrough)
+        backend = load_backend(self.parser_backend).name
+        # As the translation cache keys, the default moz backend is not recorded
+        if backend != "moz":
+            options["Parser_backend"] = backend
+        return options
+
+    @property
+    def rules(self) -> RuleEngine:
+        """Compiled not allowed and replace statements of the dialect pair"""
+        return get_rules(self.from_dialect, self.to_dialect)
+
+    def _parse(self, query:str, parsed:dict=None) -> Parser:
+        """Parse a statement, once for every target
+        :param query: statement without comments
+        :param parsed: Parsers, or their errors, of the statements already parsed for another target
+        :return: the Parser
+        """
+        if parsed is None:
+            return Parser(query, clean=False, timeout=self.parse_timeout, backend=self.parser_backend)
+        if query not in parsed:
+            try:
+                parsed[query] = Parser(query, clean=False, timeout=self.parse_timeout, backend=self.parser_backend)
+            except ParserError as err:
+                parsed[query] = err
+        if isinstance(parsed[query], Exception):
+            raise parsed[query]
+        return parsed[query]
+
+    def translate_statement(self, query:str, parsed:dict=None)->tuple:
+        """Translate a single statement
+        :param query: statement without comments, ended by its semicolon
+        :param parsed: Optional dictionary shared by the targets of the statement, so it is parsed once
+        :return: The resulting text + The statement errors, None if the statement has no translation + The statement kind
+        :rtype: string, list, string
+        """
+        transpiler = self.transpiler
+        rules = self.rules
+        with profiler.active().stage("classify"):
+            kind, matched = rules.classify(query)
+
+        #Not Allowed COMMANDS
+        if kind == NOT_ALLOWED:
+            problems = " ".join(matched.split()[:2])
+            logger.warning("Query not supported:\n--STATEMENT:%s",problems)
+            return "\n/* STATEMENT ERRORS:" +problems+ '*/\n' +  query + "\n", [{problems:"HARD:30"}], kind
+        #Select Statments + CTE + Allowed COMMANDS WITH SELECT
+        if kind == ALLOWED:
+            non_sql = query.replace(matched,"") 
+            try:
+                translation = None
+                if self.passthrough:
+                    translation = self.pass_through.translate(matched, lambda: self._parse(matched, parsed))
+                    # Copies outside the verified sample were not parsed, they are not counted as successes
+                    if translation is not None and not self.pass_through.sampled(matched):
+                        kind = COPIED
+                if translation is None and self.translation_cache is not None:
+                    translation = self.translations.get(transpiler, matched, load_backend(self.parser_backend).name)
+                if translation is None:
+                    if self.fingerprint:
+                        translation = self.templates.translate(matched)
+                    else:
+                        translation = transpiler.translate(self._parse(matched, parsed))
+                    if self.translation_cache is not None:
+                        self.translations.put(transpiler, matched, translation, load_backend(self.parser_backend).name)
+                sql, problems = translation
+                if problems:
+                    return "\n/* TRANSPILER ERRORS: " + str(problems)+ "*/\n" + non_sql + sql + ";" + "\n", problems, kind
+                return "\n" + non_sql + sql + ";" + "\n", problems, kind
+            except ParseTimeout as err:
+                return "\n/* PARSER ERRORS: " + str(err) + "*/\n" + query + "\n", [{"parser timeout":"HARD:30: "+str(err)}], kind
+            except ParserError as err:
+                return "\n/* PARSER ERRORS: " + str(err) + "*/\n" + query + "\n", [{"parser":"HARD:30: "+str(err)}], kind
+        # Exception that we can deal with replace 
+        query, n_replaced = rules.replace(query, count=True)
+        return "\n" + query + "\n", None, REPLACED if n_replaced else kind
+
+    def write_script(self, script, write, f_name:str=None)->tuple:
+        """Translate the script to the target language, writing each statement as soon as it is translated
+        :param script: SQL script, as a string or a text file object
+        :param write: Function called with each piece of the resulting script, as a file write method
+        :param f_name: File name of the exported statement records
+        :return: The list of errors + Number of queries + True if some statement was not fully translated + Number of
+            statements copied without being parsed
+        :rtype: list, int, bool, int
+        """
+        return self.write_targets(script, {self.to_dialect: write}, f_name)[self.to_dialect]
 
-    def translate_script(self, script:str)->list:
+    def translate_each(self, query:str, targets)->list:
+        """Translate a statement to each target, parsing it once
+        :param query: statement without comments, ended by its semicolon
+        :param targets: Target dialects
+        :return: The resulting text + The statement errors + The statement kind + The elapsed time, of each target
+        """
+        readers = self.readers
+        parsed = dict() if len(targets) > 1 else None
+        results = list()
+        for target in targets:
+            start = perf_counter()
+            # Comments were removed by the splitter, remove spaces
+            text, problems, kind = readers[target].translate_statement(query.lstrip(), parsed)
+            results.append((text, problems, kind, perf_counter() - start))
+        return results
+
+    def statement_pool(self) -> ProcessPoolExecutor:
+        """Pool translating the statement chunks, started on first use and kept until close"""
+        if self._pool is None:
+            prof = profiler.active()
+            initargs = (self.worker_options(), prof.top if prof.enabled else 0, False)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=initargs)
+        return self._pool
+
+    def close(self):
+        """Stop the statement pool and close the input archive"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def _translate_chunks(self, statements, splitter:StatementSplitter, targets:tuple):
+        """Send the statements to the statement pool in chunks, keeping a few chunks in flight
+        :return: generator of each statement + its offset + its results of each target, in the script order
+        """
+        pool = self.statement_pool()
+        prof = profiler.active()
+        statements = iter(statements)
+        in_flight = deque()
+        while True:
+            chunk = list()
+            offsets = list()
+            for query in islice(statements, self.statement_chunksize):
+                chunk.append(query)
+                offsets.append(splitter.offset)
+            if chunk:
+                in_flight.append((chunk, offsets, pool.submit(_translate_statements, (targets, chunk))))
+            if not in_flight:
+                return
+            if chunk and len(in_flight) < 2 * self.workers:
+                continue
+            chunk, offsets, future = in_flight.popleft()
+            results, f_profile, counters = future.result()
+            if f_profile is not None:
+                current_file = prof.current_file
+                prof.merge(f_profile)
+                prof.current_file = current_file
+            self.merge_counters(counters) if counters is not None else None
+            yield from zip(chunk, offsets, results)
+
+    def write_targets(self, script, writes:dict, f_name:str=None)->dict:
+        """Translate the script to each target language, splitting and parsing each statement once
+        :param script: SQL script, as a string or a text file object
+        :param writes: Write function of each target dialect, see write_script
+        :param f_name: File name of the exported statement records
+        :return: The list of errors + Number of queries + True if some statement was not fully translated, of each target
+        :rtype: dict
+        """
+        targets = tuple(writes)
+        errors = {target: list() for target in targets}
+        has_errors = dict.fromkeys(targets, False)
+        copied = dict.fromkeys(targets, 0)
+        exporter = self.exporter
+        splitter = StatementSplitter(script, track_offsets=exporter is not None)
+        prof = profiler.active()
+        statements = _timed(prof, splitter) if prof.enabled else splitter
+        if self.statement_chunksize and self.workers > 1:
+            translated = self._translate_chunks(statements, splitter, targets)
+        else:
+            translated = ((query, splitter.offset, self.translate_each(query, targets)) for query in statements)
+
+        for index, (query, offset, results) in enumerate(translated):
+            for target, (text, problems, kind, elapsed) in zip(targets, results):
+                writes[target](text)
+                if problems is not None:
+                    errors[target].append(problems)
+                    has_errors[target] = has_errors[target] or bool(problems)
+                copied[target] += kind == COPIED
+                if prof.enabled:
+                    prof.add("statement:" + (kind or "other"), elapsed)
+                    prof.statement(elapsed, query)
+                if exporter is not None:
+                    exporter.write(statement_record(f_name, index, offset, kind, problems, elapsed,
+                                                    self.from_dialect, target))
+        for write in writes.values():
+            write(splitter.tail)
+        return {target: (errors[target], splitter.n_statements, has_errors[target], copied[target]) for target in targets}
+
+    def translate_script(self, script)->list:
         """Translate the script to the target language
-        :param script: SQL script
-        :return: The resulting script + The list of errors + Number of queries
+        :param script: SQL script, as a string or a text file object
+        :return: The resulting script + The list of errors + Number of queries, or a dictionary with them for each
+            target when the reader has several targets. The statements copied by the pass-through without being
+            parsed are counted in copied, for create_summary
         :rtype: string, list, int
         """
-        result = ""
-        errors = list()
-        command = re.findall("(.*?;)", script, flags=re.DOTALL) 
-        n_queries = len(command)
-        transpiler = Transpiler(from_dialect=self.from_dialect, to_dialect=self.to_dialect) 
-        regex_key = self.from_dialect + '-' + self.to_dialect 
-
-        if self.to_dialect == 'spark':
-            obj = Spark(source = self.from_dialect)
-        if self.to_dialect == 'athena':
-            obj = Athena(source = self.from_dialect)
-
-        regex_stat = obj.STATEMENTS(regex_key)
-
-        for query in command:
-            # Clean comments and remove spaces
-            query =  re.sub(r'(--.*?\n)|(/\*(.|\n)*?\*/)', '', query)
-            query = query.lstrip()
-
-            #Not Allowed COMMANDS
-            if r_not_allowed := re.search("|".join(regex_stat["not_allowed"].values()),query, flags= re.IGNORECASE): 
-                problems = " ".join(r_not_allowed[0].split()[:2])
-                logger.warning("Query not supported:\n--STATEMENT:%s",problems)
-                result += "\n/* STATEMENT ERRORS:" +problems+ '*/\n' +  query + "\n"
-                errors.append([{problems:"HARD:30"}])
-            #Select Statments + CTE + Allowed COMMANDS WITH SELECT
-            elif r_allowed := re.search('(WITH.*?;)|(SELECT.*?;)', query, flags=re.DOTALL | re.IGNORECASE):
-                non_sql = query.replace(r_allowed[0],"") 
-                try:
-                    _parser = Parser(r_allowed[0])
-                    sql, problems = transpiler.translate(_parser)
-                    if problems:
-                        result += "\n/* TRANSPILER ERRORS: " + str(problems)+ "*/\n" + non_sql + sql + ";" + "\n"
-                    else: 
-                        result += "\n" + non_sql + sql + ";" + "\n"
-                    errors.append(problems)
-                except ParseException as err:
-                    result += "\n/* PARSER ERRORS: " + str(err) + "*/\n" + query + "\n"
-                    errors.append([{"parser":"HARD:30: "+str(err)}])
-            else: 
-                # Exception that we can deal with replace 
-                if r_replace := re.findall("|".join(regex_stat['replace'].values()),query, flags = re.IGNORECASE):
-                    for item in list(set(r_replace)):
-                        key = list(regex_stat['replace'].keys())[list(regex_stat['replace'].values()).index(item.upper())]
-                        query = query.replace(item, key)
-                result += "\n" + query + "\n"  
-        result += script.split(";")[-1]
-        return result, errors, n_queries
+        results = {target: list() for target in self.targets}
+        try:
+            translated = self.write_targets(script, {target: result.append for target, result in results.items()})
+        finally:
+            self.close()
+        self._translations.commit() if self._translations is not None else None
+        scripts = {target: ("".join(results[target]), errors, n_queries)
+                   for target, (errors, n_queries, _, _) in translated.items()}
+        self.copied = {target: copied for target, (_, _, _, copied) in translated.items()}
+        return scripts[self.to_dialect] if len(self.targets) == 1 else scripts
     
     def create_folders(self)->str:
         """Create output folders 
@@ -113,10 +503,11 @@ class Reader():
             os.makedirs(failed)
         return sucess, failed
 
-    def create_summary(self, errors:list, n_queries:int)->list:
+    def create_summary(self, errors:list, n_queries:int, copied:int=None)->list:
         """Create the script summary
         :param errors: The list of errors that occurred during translation
         :param n_queries: Number of queries per script
+        :param copied: Optional number of queries copied without being parsed, counted apart from the successes
         :return: The list with the summary
         """
      
@@ -131,44 +522,218 @@ class Reader():
                 p_failed.append(p_desc[0])
         failed = dict(Counter(p_failed))
         success = n_queries - len(p_failed)
+        if copied is not None:
+            return [{"N_queries":n_queries},{"Success":success - copied},{"Failed":failed},{"Er_types":p_type},{"Copied":copied}]
         return [{"N_queries":n_queries},{"Success":success},{"Failed":failed},{"Er_types":p_type}]
 
 
-    def translate_files(self, summary_dict:bool=False)->dict:
-        """Read and translate input directory files 
-        :param summary_dict: If true, returns the summary dictionary
-        :return:The dictionary with the summary of the files read
+    def translate_file(self, files:str, success:str, failed:str)->tuple:
+        """Read, translate and save a single file.
+        The result is written to a temporary file while it is translated, then moved to its folder.
+        :param files: File path
+        :param success: Fully translated folder
+        :param failed: Partially translated folder
+        :return: The file name + The file summary + The output folder
         """
-        r_summary = dict()
-        success, failed = self.create_folders()
-        for files in Path(self.input_dir).iterdir():
-            if files.is_file():
-                f_name = os.path.basename(files)
-                with open(files) as f: script = f.read()
-                result, errors, n_queries = self.translate_script(script)
-                if re.search('(TRANSPILER ERRORS)|(PARSER ERRORS)|(STATEMENT ERRORS)',result):
-                    out_path = os.path.join(failed, f_name) 
-                    with open(out_path,"w+") as f: script = f.write(result)
-                else:
-                    out_path = os.path.join(success, f_name) 
-                    with open(out_path,"w+") as f: script = f.write(result)
-                r_summary[f_name] = self.create_summary(errors, n_queries)
-        success_files = len(os.listdir(success))
-        failed_files = len(os.listdir(failed))
-        f_summary = {"Input_dir" : self.input_dir, "From_dialect": self.from_dialect, "To_dialect":self.to_dialect, "Sucess_files":success_files, "Failed_files":failed_files, "Files" : r_summary}
-        Report(f_summary, self.output_dir).generate_report() if self.migration_report else None
-        return f_summary if summary_dict else None
-
-
-
-
-
-
-
+        return self.translate_targets(files, {self.to_dialect: (success, failed)})[self.to_dialect]
 
+    def translate_targets(self, files:str, folders:dict, f_name:str=None)->dict:
+        """Read a single file once, translate and save it for each target, see translate_file
+        :param files: File path, or member path of the input archive
+        :param folders: Fully translated and partially translated folders of each target
+        :param f_name: Path of the file relative to the input directory, kept under the output folders. The file
+            name if None
+        :return: The file name + The file summary + The output folder, of each target
+        """
+        start = perf_counter()
+        f_name = os.path.basename(files) if f_name is None else f_name
+        prof = profiler.active()
+        prof.current_file = f_name
+        tmp_name = f".{os.path.basename(f_name)}.{os.getpid()}{TMP_SUFFIX}"
+        tmp_paths = {target: os.path.join(self.readers[target].output_dir, tmp_name) for target in folders}
+        out_paths = dict()
+        try:
+            # The exported offsets count the line breaks as they are in the file
+            with self._open(files, '' if self.exporter is not None else None) as f, ExitStack() as stack:
+                writes = {target: stack.enter_context(open(tmp_path, "w")).write for target, tmp_path in tmp_paths.items()}
+                translated = self.write_targets(f, writes, f_name)
+            with prof.stage("write"):
+                for target, (success, failed) in folders.items():
+                    out_paths[target] = os.path.join(failed if translated[target][2] else success, f_name)
+                    if os.path.dirname(f_name):
+                        os.makedirs(os.path.dirname(out_paths[target]), exist_ok=True)
+                    os.replace(tmp_paths[target], out_paths[target])
+        except BaseException:
+            for tmp_path in tmp_paths.values():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+        self._translations.commit() if self._translations is not None else None
+        elapsed = perf_counter() - start
+        prof.file(f_name, elapsed)
+        results = dict()
+        for target, (errors, n_queries, _, copied) in translated.items():
+            summary = self.create_summary(errors, n_queries, copied if self.passthrough else None)
+            summary += [{"Time":round(elapsed, 6)}]
+            success, failed = folders[target]
+            results[target] = f_name, summary, os.path.basename(failed if translated[target][2] else success)
+        return results
 
+    def _open(self, files:str, newline:str=None):
+        """Open an input file, or a member of the input archive, as text"""
+        if self.from_archive:
+            return self.archive.open(files, newline)
+        return open(files, encoding=self.encoding, newline=newline)
 
+    def discover(self, folders:dict=None)->list:
+        """Find the input directory files to translate, with the recursive, include and exclude options
+        :param folders: Output folders of each target, skipped when they are inside the input directory
+        :return: path, path relative to the input directory and size of each file, the largest first. The members of
+            a compressed tar archive are kept in archive order, as they are decompressed
+        """
+        if self.from_archive:
+            files = [(member, member, size) for member, size in self.archive.members()
+                     if (self.recursive or "/" not in member) and self._selected(member)]
+            if self.archive.random_access:
+                files.sort(key=lambda item: (-item[2], item[1]))
+            return files
+        skip, skip_files = self._outputs(folders)
+        files = list()
+        stack = [self.input_dir]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if self.recursive and os.path.realpath(entry.path) not in skip:
+                            stack.append(entry.path)
+                        continue
+                    if not entry.is_file() or entry.name == MANIFEST_NAME or entry.name.endswith(TMP_SUFFIX):
+                        continue
+                    if os.path.realpath(entry.path) in skip_files:
+                        continue
+                    f_name = Path(os.path.relpath(entry.path, self.input_dir)).as_posix()
+                    if self._selected(f_name):
+                        files.append((entry.path, f_name, entry.stat().st_size))
+        # The largest files first, so the last ones do not keep a single worker busy. Ties by name
+        files.sort(key=lambda item: (-item[2], item[1]))
+        return files
 
+    def _outputs(self, folders:dict=None) -> tuple:
+        """Folders and files written by the runs of this reader, skipped when they are inside the input directory
+        :param folders: Output folders of each target
+        :return: set of folder paths + set of file paths
+        """
+        dirs = {os.path.realpath(folder) for pair in (folders or dict()).values() for folder in pair}
+        files = set()
+        for reader in [self] + list(self.readers.values()):
+            for base in {self.output_dir, reader.output_dir}:
+                dirs.update(os.path.realpath(os.path.join(base, name)) for name in ("Fully Translated", "Partially Translated"))
+                if os.path.isfile(os.path.join(base, "Report", "report.html")):
+                    dirs.add(os.path.realpath(os.path.join(base, "Report")))
+                # Target folders of a previous run with several targets
+                for target in DIALECTS:
+                    path = os.path.join(base, target)
+                    if any(os.path.isdir(os.path.join(path, name)) for name in ("Fully Translated", "Partially Translated")):
+                        dirs.add(os.path.realpath(path))
+            if reader.summary_store is not None:
+                # With the stores of each target of a run with several targets
+                root, ext = os.path.splitext(reader.summary_store)
+                files.add(os.path.realpath(reader.summary_store))
+                files.update(os.path.realpath(f"{root}.{target}{ext}") for target in DIALECTS)
+        if self.export is not None:
+            files.add(os.path.realpath(self.export))
+        if self.translation_cache is not None:
+            files.update(os.path.realpath(self.translation_cache + suffix) for suffix in ("", "-wal", "-shm", "-journal"))
+        return dirs, files
 
+    def _selected(self, f_name:str) -> bool:
+        """Check a path relative to the input directory against the include and exclude patterns"""
+        if self.include and not any(fnmatch(f_name, pattern) for pattern in self.include):
+            return False
+        return not any(fnmatch(f_name, pattern) for pattern in self.exclude)
 
-                
\ No newline at end of file
+    def translate_files(self, summary_dict:bool=False)->dict:
+        """Read and translate input directory files 
+        :param summary_dict: If true, returns the summary dictionary
+        :return:The dictionary with the summary of the files read, or a dictionary with the summary of each target
+            when the reader has several targets
+        """
+        readers = self.readers
+        folders = {target: reader.create_folders() for target, reader in readers.items()}
+        files = self.discover(folders)
+        manifests = None
+        if self.incremental:
+            manifests = {target: Manifest(reader.output_dir, self.from_dialect, target, self.manifest_options())
+                         for target, reader in readers.items()}
+        hashes = dict()
+        unchanged = dict()
+        pending = list()
+        for f, f_name, _ in files:
+            if manifests is not None:
+                hashes[f_name] = Manifest.file_hash(f, self.archive)
+                summaries = {target: manifest.lookup(f_name, hashes[f_name]) for target, manifest in manifests.items()}
+                # A file is translated again for every target if one of them changed
+                if all(summary is not None for summary in summaries.values()):
+                    unchanged[f_name] = summaries
+                    continue
+            pending.append((f, f_name))
+        if pending:
+            logger.info("--READER:%s files to translate, %s unchanged", len(pending), len(files) - len(pending))
+        prof = profiler.active()
+        exporter = StatementExporter(self.export) if self.export is not None else None
+        aggregators = dict()
+        pool = None
+        try:
+            for target, reader in readers.items():
+                aggregators[target] = SummaryAggregator(self.input_dir, self.from_dialect, target, reader.summary_store)
+            if self.workers > 1 and len(pending) > 1 and not self.statement_chunksize:
+                initargs = (self.worker_options(), prof.top if prof.enabled else 0, exporter is not None)
+                pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=initargs)
+                tasks = [(f, folders, f_name) for f, f_name in pending]
+                # One file per task, chunks would give the largest files to the same worker
+                results = pool.map(_translate_file_worker, tasks)
+            else:
+                self.exporter = exporter
+                results = ((self.translate_targets(f, folders, f_name), None, None, None) for f, f_name in pending)
+            for f_name, summaries in unchanged.items():
+                for target, summary in summaries.items():
+                    aggregators[target].add(f_name, summary, manifests[target].location(f_name))
+            # The results come in the order of pending, the largest files first
+            for translated, f_profile, records, counters in results:
+                prof.merge(f_profile) if f_profile is not None else None
+                exporter.write_many(records) if records is not None else None
+                self.merge_counters(counters) if counters is not None else None
+                for target, (f_name, summary, location) in translated.items():
+                    reader = readers[target]
+                    aggregators[target].add(f_name, summary, location)
+                    if manifests is not None:
+                        # Remove the output left in the other folder by a previous run
+                        previous = manifests[target].location(f_name)
+                        if previous is not None and previous != location:
+                            stale = os.path.join(reader.output_dir, previous, f_name)
+                            os.remove(stale) if os.path.exists(stale) else None
+                        manifests[target].update(f_name, hashes[f_name], location, summary)
+        finally:
+            pool.shutdown() if pool is not None else None
+            self.close()
+            self.exporter = None
+            exporter.close() if exporter is not None else None
+            for aggregator in aggregators.values():
+                aggregator.close()
+        f_summaries = dict()
+        for target, reader in readers.items():
+            manifests[target].save([f_name for _, f_name, _ in files]) if manifests is not None else None
+            f_summary = aggregators[target].to_dict()
+            if self.fingerprint:
+                f_summary["Templates"] = reader.templates.stats()
+                logger.info("--FINGERPRINT:%s", f_summary["Templates"])
+            if self.passthrough:
+                f_summary["Passthrough"] = reader.pass_through.stats()
+                logger.info("--PASSTHROUGH:%s", f_summary["Passthrough"])
+            if self.migration_report:
+                from dora_parser.report import Report
+                Report(f_summary, reader.output_dir, self.report_backend).generate_report()
+            f_summaries[target] = f_summary
+        if not summary_dict:
+            return None
+        return f_summaries[self.to_dialect] if len(self.targets) == 1 else f_summaries
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Dialect Registry Implementation"""
+from functools import lru_cache
+from importlib import import_module
+
+# Dialect name: (module, class), the module is only imported when the dialect is used
+DIALECTS = {
+    'spark': ('dora_parser.dialects.spark', 'Spark'),
+    'presto': ('dora_parser.dialects.presto', 'Presto'),
+    'impala': ('dora_parser.dialects.impala', 'Impala'),
+    'hive': ('dora_parser.dialects.hive', 'Hive'),
+    'athena': ('dora_parser.dialects.athena', 'Athena'),
+}
+
+# Dialect pairs with statement rules, supported by the Reader
+TRANSLATIONS = ['impala-spark', 'impala-athena']
+
+def register_dialect(name:str, module:str, class_name:str, sources:list=None):
+    """Register a dialect class without importing it
+    :param name: Dialect name
+    :param module: Module path of the dialect class
+    :param class_name: Dialect class name
+    :param sources: Source dialects with statement rules to this dialect
+    """
+    DIALECTS[str(name).lower()] = (module, class_name)
+    for source in sources or list():
+        if (pair := f"{str(source).lower()}-{str(name).lower()}") not in TRANSLATIONS:
+            TRANSLATIONS.append(pair)
+    load_dialect.cache_clear()
+
+@lru_cache(maxsize=None)
+def load_dialect(name:str) -> type:
+    """Import the dialect class by name, once per process
+    :param name: Dialect name
+    :return: Dialect class
+    """
+    try:
+        module, class_name = DIALECTS[name]
+    except KeyError:
+        raise ValueError(f"--TRANSPILER:DIALECT:{name}: NotImplemented'") from None
+    return getattr(import_module(module), class_name)
@@ -14,33 +14,221 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Report Class Implementation"""
-import pandas as pd
 import os
-import seaborn as sns
-import matplotlib.pyplot as plt
 import base64
+import html
+import json
+from collections import Counter
 from io import BytesIO
 
+# Report backends: "html" and "paginated" need no extra dependency, "pandas" uses pandas, seaborn and matplotlib
+BACKENDS = ['html', 'paginated', 'pandas']
 
+# Rows rendered by each page of the paginated report
+PAGE_SIZE = 100
+
+TABLE_HEAD = '''<h3><span style="font-style: italic;">Detailed analysis</span>
+                            <input style="width: 300px; margin-left: auto; float: right;" 
+                            type="search" placeholder="Search..." class="form-control search-input" data-table="datatable"/>
+                        </h3>'''
+
+TABLE_STYLE = '''<style  type="text/css" > #T_0001 thead {background-color: #000;color: white;}    
+                        #T_0001 th,td {text-align: center;border: 1px solid #706E6E;padding: 5px;}    
+                        #T_0001 {border-collapse: collapse;font-size: 11pt;border: 1px solid #706E6E;margin-left: auto;margin-right: auto;}
+                        </style>'''
+
+TABLE_SCRIPT = '''<script>
+        (function(document) {
+            'use strict';
+            var F_Table = (function(Array) {
+                var input;
+                function _InSearch(e) {
+                    input = e.target;
+                    var tables = document.getElementsByClassName(input.getAttribute('data-table'));
+                    Array.forEach.call(tables, function(table) {
+                        Array.forEach.call(table.tBodies, function(tbody) {
+                            Array.forEach.call(tbody.rows, function(row) {
+                                var content = row.textContent.toLowerCase();
+                                var search_val = input.value.toLowerCase();
+                                row.style.display = content.indexOf(search_val) > -1 ? '' : 'none';
+                            });
+                        });
+                    });
+                }
+                return {
+                    init: function() {
+                        var inputs = document.getElementsByClassName('search-input');
+                        Array.forEach.call(inputs, function(input) {
+                            input.oninput = _InSearch;
+                        });
+                    }
+                };
+            })(Array.prototype);
+            document.addEventListener('readystatechange', function() {
+                if (document.readyState === 'complete') {
+                    F_Table.init();
+                }
+            });
+        })(document);
+       </script>'''
+
+PAGE_HEAD = '''<h3><span style="font-style: italic;">Detailed analysis</span>
+                            <input style="width: 300px; margin-left: auto; float: right;" 
+                            type="search" placeholder="Search files or errors..." class="form-control" id="dora-search"/>
+                        </h3>'''
+
+PAGE_CONTROLS = '''<p style="text-align: center;">
+                        <button id="dora-prev">&lt;</button> <span id="dora-page"></span> <button id="dora-next">&gt;</button>
+                        <span style="margin-left: 20px;">Click the Failed Queries header to sort</span>
+                        </p>'''
+
+PAGE_SCRIPT = '''<script>
+        (function(document) {
+            'use strict';
+            // Row: [file, queries, successful, failed, error types, time, number of failed, search key]
+            var rows = JSON.parse(document.getElementById('dora-rows').textContent);
+            var size = __PAGE_SIZE__, page = 0, order = 0, visible = rows.map(function(_, i) { return i; });
+            var body = document.querySelector('#T_0001 tbody');
+            function escape(value) {
+                return String(value).replace(/[&<>"]/g, function(c) {
+                    return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}[c];
+                });
+            }
+            function render() {
+                var pages = Math.max(Math.ceil(visible.length / size), 1);
+                page = Math.min(page, pages - 1);
+                var html = '';
+                visible.slice(page * size, (page + 1) * size).forEach(function(i) {
+                    html += '<tr><th>' + i + '</th>';
+                    for (var c = 0; c < 6; c++) { html += '<td>' + escape(rows[i][c]) + '</td>'; }
+                    html += '</tr>';
+                });
+                body.innerHTML = html;
+                document.getElementById('dora-page').textContent = (page + 1) + ' / ' + pages + ' (' + visible.length + ' files)';
+            }
+            function sort() {
+                if (order !== 0) {
+                    visible.sort(function(a, b) { return order * (rows[a][6] - rows[b][6]) || a - b; });
+                } else {
+                    visible.sort(function(a, b) { return a - b; });
+                }
+            }
+            document.getElementById('dora-search').oninput = function(e) {
+                var value = e.target.value.toLowerCase();
+                visible = [];
+                for (var i = 0; i < rows.length; i++) {
+                    if (rows[i][7].indexOf(value) > -1) { visible.push(i); }
+                }
+                sort();
+                page = 0;
+                render();
+            };
+            document.querySelector('#T_0001 th[data-column="3"]').onclick = function() {
+                order = order === -1 ? 1 : order === 1 ? 0 : -1;
+                sort();
+                page = 0;
+                render();
+            };
+            document.getElementById('dora-prev').onclick = function() { page = Math.max(page - 1, 0); render(); };
+            document.getElementById('dora-next').onclick = function() { page += 1; render(); };
+            render();
+        })(document);
+       </script>'''
+
+COLUMNS = ["Files", "Number of Queries", "Successful Queries", "Failed Queries", "Errors Types", "Time (s)"]
 
 class Report():
-    def __init__(self, summary_dict:dict,  output_dir:str):
+    def __init__(self, summary_dict:dict,  output_dir:str, backend:str='html'):
         """Initialize the report class
         :param summary_dict: The dictionary with the summary of the files read
         :param output_dir: Output Directory
+        :param backend: "html" writes the report in a single pass without extra dependencies, "pandas" uses pandas and seaborn
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"Only the following report backends are supported:{BACKENDS}")
         self.summary_dict = summary_dict
         self.output_dir = output_dir
+        self.backend = backend
+
+    @classmethod
+    def file_row(cls, summary:list) -> dict:
+        """Merge the list of single key dictionaries of a file summary
+        :param summary: The file summary
+        :return: dictionary with N_queries, Success, Failed, Er_types and Time
+        """
+        row = dict()
+        for item in summary:
+            row.update(item)
+        return row
+
+    def iter_cells(self, errors:Counter):
+        """Yield the cells of each file, counting the error types in the same pass
+        :param errors: Counter updated with the error types of each file
+        :return: the cells in the COLUMNS order + the file error types + the number of failed queries
+        """
+        for f_name, summary in self.summary_dict["Files"].items():
+            row = self.file_row(summary)
+            er_types = row.get("Er_types", list())
+            errors.update(er_types)
+            failed = row.get("Failed", dict())
+            cells = [f_name, row.get("N_queries", 0), row.get("Success", 0),
+                     ", ".join(f"{level}: {n}" for level, n in failed.items()), ", ".join(er_types), row.get("Time", "")]
+            yield cells, er_types, sum(failed.values())
+
+    def iter_rows(self, errors:Counter):
+        """Yield the html rows of the table, counting the error types in the same pass
+        :param errors: Counter updated with the error types of each file
+        """
+        for i, (cells, _, _) in enumerate(self.iter_cells(errors)):
+            yield f"<tr><th>{i}</th>" + "".join(f"<td>{html.escape(str(cell))}</td>" for cell in cells) + "</tr>\n"
+
+    def iter_records(self, errors:Counter):
+        """Yield the rows of the paginated report as compact JSON, counting the error types in the same pass
+        The last two values of each row are the number of failed queries and the lowercase search key
+        :param errors: Counter updated with the error types of each file
+        """
+        for cells, er_types, n_failed in self.iter_cells(errors):
+            key = " ".join([str(cells[0])] + er_types).lower()
+            # "</" would close the script element holding the rows
+            yield json.dumps(cells + [n_failed, key], separators=(",", ":")).replace("</", "<\\/")
+
+    @classmethod
+    def create_svg(cls, errors:Counter, top:int=10) -> str:
+        """Create the most common errors chart as inline svg
+        :param errors: Counter of error types
+        :param top: Number of bars
+        :return: the svg element
+        """
+        total = sum(errors.values())
+        common = errors.most_common(top)
+        label_width, bar_width, bar_height = 260, 480, 28
+        height = 40 + bar_height * max(len(common), 1)
+        largest = common[0][1] if common else 1
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{label_width + bar_width + 80}" height="{height}" font-family="sans-serif" font-size="12">',
+                 f'<text x="{(label_width + bar_width) // 2}" y="20" font-size="14">Most Common Errors</text>']
+        for i, (error, n) in enumerate(common):
+            y = 32 + i * bar_height
+            width = bar_width * n / largest
+            parts.append(f'<text x="{label_width - 8}" y="{y + bar_height // 2 + 4}" text-anchor="end">{html.escape(str(error))}</text>')
+            parts.append(f'<rect x="{label_width}" y="{y}" width="{width:.1f}" height="{bar_height - 6}" fill="black"/>')
+            parts.append(f'<text x="{label_width + width + 6:.1f}" y="{y + bar_height // 2 + 4}">{100 * n / total:.1f}%</text>')
+        parts.append('</svg>')
+        return "".join(parts)
 
 
     def create_visual(self):
-        """Create the report's table and chart
+        """Create the report's table and chart with pandas and seaborn
         :return: the table in html and the encoded chart
         """
+        import pandas as pd
+        import seaborn as sns
+        import matplotlib.pyplot as plt
         #Table 1
-        df = pd.DataFrame.from_dict(self.summary_dict["Files"], orient='index')
+        # The columns are taken by position, without the Copied count of the pass-through
+        files = {f_name: [item for item in summary if "Copied" not in item] for f_name, summary in self.summary_dict["Files"].items()}
+        df = pd.DataFrame.from_dict(files, orient='index')
         df.reset_index(inplace = True)
-        df.columns = ["Files","Number of Queries", "Successful Queries", "Failed Queries", "Errors Types"]
+        df.columns = COLUMNS[:len(df.columns)]
         for i in df:
             if i != "Failed Queries":
                 df[i] = df[i].apply(pd.Series)
@@ -68,86 +256,91 @@ class Report():
         fig.set_size_inches(14, 5)
         tmpfile = BytesIO()
         fig.savefig(tmpfile, format='png')
+        plt.close(fig)
         data_u = base64.b64encode(tmpfile.getvalue()).decode('utf-8')
         img_tag = '<img src="data:image/png;base64,{0}" style="max-height: 600px; max-width: 800px;">'.format(data_u)
 
         return table_html,img_tag
 
-    def generate_report(self):
-        """Create the report in html
+    def create_info(self) -> str:
+        """Create the report's heading and overview
+        :return: the heading and overview in html
         """
-        table_html,img_tag = self.create_visual()
-
         heading = '<h1 style="font-style: italic;">Migration Report</h1>'
 
         n_files = self.summary_dict['Failed_files'] + self.summary_dict['Sucess_files']
 
-        input_dir = '<li><b>Input Directory: </b>'+ self.summary_dict['Input_dir'] + '</li>'
+        input_dir = '<li><b>Input Directory: </b>'+ str(self.summary_dict['Input_dir']) + '</li>'
         source = '<li><b>Source: </b>'+ self.summary_dict['From_dialect'] + '</li>'
         destination = '<li><b>Target: </b>'+ self.summary_dict['To_dialect'] + '</li>'
         total_files = '<dt><li><b>Total Files Read: </b>'+ str(n_files) + '</li></dt>'
         sus_files = '<dd><li><b>Fully Translated: </b>'+ str(self.summary_dict['Sucess_files']) + '</li></dd>'
         fai_files = '<dd><li><b>Partially Translated: </b>'+ str(self.summary_dict['Failed_files']) + '</li></dd>'
+        # Statements copied by the pass-through without being parsed
+        copied = self.summary_dict.get('Totals', dict()).get('Copied')
+        if copied is not None:
+            fai_files += '<dt><li><b>Queries Copied Without Parsing: </b>'+ str(copied) + '</li></dt>'
 
-        info = '<dl>'+input_dir+source+destination+total_files+sus_files+fai_files+'</dl>'
+        return heading + '<dl>'+input_dir+source+destination+total_files+sus_files+fai_files+'</dl>'
 
-        table_head = '''<h3><span style="font-style: italic;">Detailed analysis</span>
-                            <input style="width: 300px; margin-left: auto; float: right;" 
-                            type="search" placeholder="Search..." class="form-control search-input" data-table="datatable"/>
-                        </h3>'''
-
-        table_style = '''<style  type="text/css" > #T_0001 thead {background-color: #000;color: white;}    
-                        #T_0001 th,td {text-align: center;border: 1px solid #706E6E;padding: 5px;}    
-                        #T_0001 {border-collapse: collapse;font-size: 11pt;border: 1px solid #706E6E;margin-left: auto;margin-right: auto;}
-                        </style>'''
+    def report_path(self) -> str:
+        """Create the report folder
+        :return: the report file path
+        """
+        report = os.path.join(self.output_dir, "Report")
+        if not os.path.exists(report):
+            os.makedirs(report)
+        return os.path.join(report, "report.html")
 
-        table_script = '''<script>
-        (function(document) {
-            'use strict';
-            var F_Table = (function(Array) {
-                var input;
-                function _InSearch(e) {
-                    input = e.target;
-                    var tables = document.getElementsByClassName(input.getAttribute('data-table'));
-                    Array.forEach.call(tables, function(table) {
-                        Array.forEach.call(table.tBodies, function(tbody) {
-                            Array.forEach.call(tbody.rows, function(row) {
-                                var content = row.textContent.toLowerCase();
-                                var search_val = input.value.toLowerCase();
-                                row.style.display = content.indexOf(search_val) > -1 ? '' : 'none';
-                            });
-                        });
-                    });
-                }
-                return {
-                    init: function() {
-                        var inputs = document.getElementsByClassName('search-input');
-                        Array.forEach.call(inputs, function(input) {
-                            input.oninput = _InSearch;
-                        });
-                    }
-                };
-            })(Array.prototype);
-            document.addEventListener('readystatechange', function() {
-                if (document.readyState === 'complete') {
-                    F_Table.init();
-                }
-            });
-        })(document);
-       </script>'''    
+    def generate_report(self):
+        """Create the report in html
+        """
+        if self.backend == 'pandas':
+            return self.generate_pandas_report()
+        if self.backend == 'paginated':
+            return self.generate_paginated_report()
+        errors = Counter()
+        with open(self.report_path(), "w+") as file:
+            file.write(self.create_info())
+            # The chart is written after the rows, when the error counts are known, and shown above them
+            file.write('<div style="display: flex; flex-direction: column;">')
+            file.write('<div class="container" style="order: 2;">' + TABLE_HEAD + TABLE_STYLE)
+            file.write('<table border="1" class="dataframe mt40 datatable" id="T_0001"><thead><tr style="text-align: right;"><th></th>')
+            file.write("".join(f"<th>{column}</th>" for column in COLUMNS) + '</tr></thead><tbody>\n')
+            for row in self.iter_rows(errors):
+                file.write(row)
+            file.write('</tbody></table></div>')
+            file.write('<div class="chart" style="order: 1;"><h3 style="font-style: italic;">Main errors:</h3>' + self.create_svg(errors) + '</div>')
+            file.write('</div>' + TABLE_SCRIPT)
 
+    def generate_paginated_report(self):
+        """Create the report in html with the rows as JSON, rendering only the visible page
+        """
+        errors = Counter()
+        with open(self.report_path(), "w+") as file:
+            file.write(self.create_info())
+            file.write('<div style="display: flex; flex-direction: column;">')
+            file.write('<div class="container" style="order: 2;">' + PAGE_HEAD + TABLE_STYLE)
+            file.write('<table border="1" class="dataframe mt40" id="T_0001"><thead><tr style="text-align: right;"><th></th>')
+            file.write("".join(f'<th data-column="{i}">{column}</th>' for i, column in enumerate(COLUMNS)) + '</tr></thead><tbody></tbody></table>')
+            file.write(PAGE_CONTROLS + '</div>')
+            file.write('<script type="application/json" id="dora-rows">[')
+            for i, record in enumerate(self.iter_records(errors)):
+                file.write(("," if i else "") + record + "\n")
+            file.write(']</script>')
+            file.write('<div class="chart" style="order: 1;"><h3 style="font-style: italic;">Main errors:</h3>' + self.create_svg(errors) + '</div>')
+            file.write('</div>' + PAGE_SCRIPT.replace("__PAGE_SIZE__", str(PAGE_SIZE)))
 
-        table = '<div class="container">' + table_head + table_style + table_html + '</div>' + table_script 
+    def generate_pandas_report(self):
+        """Create the report in html with the pandas backend
+        """
+        table_html,img_tag = self.create_visual()
 
+        table = '<div class="container">' + TABLE_HEAD + TABLE_STYLE + table_html + '</div>' + TABLE_SCRIPT 
 
         fig = '<div class="chart"> '+ '<h3 style="font-style: italic;">Main errors:</h3>'+ img_tag +'</div>'
 
-        html =  heading + info + fig + table 
-
+        html_ =  self.create_info() + fig + table 
 
-        report = os.path.join(self.output_dir, "Report")
-        if not os.path.exists(report):
-            os.makedirs(report)
-        with open(report+"/report.html","w+") as file:
-                file.write(html)
-        
+        with open(self.report_path(),"w+") as file:
+                file.write(html_)
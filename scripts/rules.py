@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Statement Rules Implementation"""
+import re
+from functools import lru_cache
+from dora_parser.transpiler import Transpiler
+
+NOT_ALLOWED = 'not_allowed'
+ALLOWED = 'allowed'
+# Kind of the other statements when a replace rule changed them
+REPLACED = 'replaced'
+
+class RuleEngine():
+    """Statement rules of a dialect pair, compiled once"""
+
+    def __init__(self, statements:dict):
+        """Initialize the rule engine class
+        :param statements: Dictionary with the not_allowed and replace statements of the dialect
+        """
+        not_allowed = "|".join(statements.get("not_allowed", dict()).values()) or "(?!)"
+        # The not allowed rules have priority over the select ones, as if each were searched in turn,
+        # but a single match call over the statement classifies it
+        self.classifier = re.compile(
+            r"(?=(?s:.*?)(?P<" + NOT_ALLOWED + ">" + not_allowed + "))"
+            r"|(?=(?s:.*?)(?P<" + ALLOWED + r">(?s:WITH.*;|SELECT.*;)))", re.IGNORECASE)
+        replace = statements.get("replace", dict())
+        self.replacer = re.compile("|".join(replace.values()), re.IGNORECASE) if replace else None
+        # Reverse lookup from the matched text to its replacement
+        self.replacements = {str(value).upper(): key for key, value in replace.items()}
+
+    def classify(self, query:str) -> tuple:
+        """Classify the statement
+        :param query: statement without comments
+        :return: NOT_ALLOWED, ALLOWED or None + the matched text
+        """
+        if match := self.classifier.match(query):
+            if (text := match.group(NOT_ALLOWED)) is not None:
+                return NOT_ALLOWED, text
+            return ALLOWED, match.group(ALLOWED)
+        return None, None
+
+    def replace(self, query:str, count:bool=False):
+        """Replace the statements that have a direct equivalent in the target dialect
+        :param query: statement without comments
+        :param count: If true, also returns the number of replacements
+        :return: the resulting statement, and the number of replacements with count
+        """
+        if self.replacer is None:
+            return (query, 0) if count else query
+        query, n = self.replacer.subn(lambda m: self.replacements.get(m.group(0).upper(), m.group(0)), query)
+        return (query, n) if count else query
+
+@lru_cache(maxsize=None)
+def get_rules(from_dialect:str, to_dialect:str) -> RuleEngine:
+    """Rule engine of the dialect pair, compiled once per process
+    :param from_dialect: From SQL dialect
+    :param to_dialect: To SQL dialect
+    :return: RuleEngine object
+    """
+    dialect = Transpiler._import_dialect(to_dialect)(source=from_dialect)
+    return RuleEngine(dialect.STATEMENTS(from_dialect + '-' + to_dialect))
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Translation Server Implementation
+
+Keeps the parser grammar, the dialects and a transpiler of each dialect pair loaded
+between requests. Requests are JSON objects, sent as JSON lines on stdin/stdout or
+posted to a local HTTP endpoint:
+
+    {"id": 1, "from_dialect": "impala", "to_dialect": "spark", "query": "SELECT ..."}
+    {"id": 2, "to_dialect": "athena", "script": "SELECT ...; SELECT ...;"}
+    {"id": 3, "to_dialect": "spark", "queries": ["SELECT ...", "SELECT ..."]}
+    {"id": 4, "stats": true}
+
+A JSON list of requests is a batch, answered with the list of their responses,
+and each response has the result and errors of cli_translate:
+
+    {"id": 1, "result": "SELECT ...", "errors": []}
+"""
+import json
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from dora_parser.parser import Parser, ParserError
+from dora_parser.reader import Reader
+from dora_parser.transpiler import Transpiler
+from dora_parser.registry import TRANSLATIONS
+from dora_parser import logger
+
+# Transpilers of the queries and readers of the scripts of each dialect pair, per process
+_TRANSPILERS = dict()
+_READERS = dict()
+
+def _transpiler(from_dialect:str, to_dialect:str) -> Transpiler:
+    """Transpiler of the dialect pair, any pair of dialects as cli_translate query"""
+    key = (str(from_dialect).lower(), str(to_dialect).lower())
+    if key not in _TRANSPILERS:
+        _TRANSPILERS[key] = Transpiler(*key)
+    return _TRANSPILERS[key]
+
+def _reader(from_dialect:str, to_dialect:str) -> Reader:
+    """Reader of the dialect pair, with its warm transpiler"""
+    key = (str(from_dialect).lower(), str(to_dialect).lower())
+    if key not in _READERS:
+        _READERS[key] = Reader(*key)
+    return _READERS[key]
+
+def _warm(pairs:list):
+    """Build the parser grammar and the transpilers of the dialect pairs
+    :param pairs: Dialect pairs as "from-to"
+    """
+    Parser("SELECT 1", cache=False)
+    for pair in pairs:
+        _transpiler(*pair.split("-")).dispatch
+        reader = _reader(*pair.split("-"))
+        reader.transpiler.dispatch
+        reader.rules
+
+def translate_request(request:dict) -> dict:
+    """Answer a translation request
+    :param request: Request with query, script or queries, and optional from_dialect and to_dialect
+    :return: response with result and errors, or error if the request failed
+    """
+    response = {"id": request.get("id")}
+    try:
+        for field in ("query", "script"):
+            if field in request and not isinstance(request[field], str):
+                raise ValueError(f"--SERVER:{field} must be a string")
+        if "queries" in request and (not isinstance(request["queries"], list) or
+                                     not all(isinstance(query, str) for query in request["queries"])):
+            raise ValueError("--SERVER:queries must be a list of strings")
+        pair = (request.get("from_dialect", "impala"), request.get("to_dialect", "athena"))
+        if "query" in request:
+            response["result"], response["errors"] = _transpiler(*pair).translate(Parser(request["query"]))
+        elif "script" in request:
+            result, errors, n_queries = _reader(*pair).translate_script(request["script"])
+            # Without the empty error lists, as cli_translate
+            response["result"] = result
+            response["errors"] = [error for error in errors if len(error) != 0]
+            response["n_queries"] = n_queries
+        elif "queries" in request:
+            response["results"] = list()
+            transpiler = _transpiler(*pair)
+            for query in request["queries"]:
+                try:
+                    result, errors = transpiler.translate(Parser(query))
+                    response["results"].append({"result": result, "errors": errors})
+                except ParserError as err:
+                    response["results"].append({"error": str(err)})
+        else:
+            response["error"] = "The request needs a query, script or queries"
+    except (ParserError, ValueError) as err:
+        response["error"] = str(err)
+    return response
+
+class TranslationServer():
+    """Dispatcher of translation requests to warm workers, with latency statistics"""
+
+    def __init__(self, workers:int=1, pairs:list=None, window:int=10000):
+        """Initialize the server class
+        :param workers: Number of worker processes, 0 answers the requests in the calling thread
+        :param pairs: Dialect pairs warmed up at start, all the supported translations by default
+        :param window: Number of latest request latencies used by the percentiles
+        """
+        self.pairs = list(TRANSLATIONS if pairs is None else pairs)
+        self.workers = max(int(workers or 0), 0)
+        self.latencies = deque(maxlen=window)
+        self.n_requests = 0
+        self._lock = threading.Lock()
+        # Without workers the transpilers are shared by the calling threads, one request at a time
+        self._serial = threading.Lock()
+        if self.workers:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm, initargs=(self.pairs,))
+            # Start the workers now instead of on the first request
+            for future in [self.pool.submit(_warm, self.pairs) for _ in range(self.workers)]:
+                future.result()
+        else:
+            self.pool = None
+            _warm(self.pairs)
+
+    def submit(self, request:dict, callback):
+        """Translate a request, calling back with the response when it is ready
+        :param request: Translation request, or {"stats": true}
+        :param callback: Function called with the response
+        """
+        if not isinstance(request, dict):
+            return callback({"id": None, "error": "--SERVER:The request must be a JSON object"})
+        if request.get("stats"):
+            return callback(dict(self.stats(), id=request.get("id")))
+        start = perf_counter()
+        def done(response:dict):
+            self._record(perf_counter() - start)
+            callback(response)
+        if self.pool is None:
+            with self._serial:
+                try:
+                    response = translate_request(request)
+                except Exception as err:
+                    # As _result with workers, an unexpected error answers the request instead of stopping the server
+                    logger.error("--SERVER:%s", err)
+                    response = {"id": request.get("id"), "error": str(err)}
+            return done(response)
+        future = self.pool.submit(translate_request, request)
+        future.add_done_callback(lambda future: done(self._result(future, request)))
+
+    def submit_batch(self, requests:list, callback):
+        """Translate a batch of requests in parallel, calling back with the list of responses when all are ready
+        :param requests: Translation requests
+        :param callback: Function called with the responses, in the order of the requests
+        """
+        responses = [None] * len(requests)
+        remaining = [len(requests)]
+        lock = threading.Lock()
+        if not requests:
+            return callback(responses)
+        def done(i:int, response:dict):
+            responses[i] = response
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            callback(responses) if last else None
+        for i, request in enumerate(requests):
+            self.submit(request, lambda response, i=i: done(i, response))
+
+    def translate(self, request):
+        """Translate a request, or a list of requests, and wait for the response
+        :param request: Translation request or list of requests
+        :return: response, or list of responses
+        """
+        event = threading.Event()
+        responses = list()
+        submit = self.submit_batch if isinstance(request, list) else self.submit
+        submit(request, lambda response: (responses.append(response), event.set()))
+        event.wait()
+        return responses[0]
+
+    @classmethod
+    def _result(cls, future, request:dict) -> dict:
+        try:
+            return future.result()
+        except Exception as err:
+            logger.error("--SERVER:%s", err)
+            return {"id": request.get("id"), "error": str(err)}
+
+    def _record(self, seconds:float):
+        with self._lock:
+            self.n_requests += 1
+            self.latencies.append(seconds)
+
+    def stats(self) -> dict:
+        """Number of requests and latency percentiles of the latest requests, in milliseconds"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            n_requests = self.n_requests
+        if not latencies:
+            return {"Requests": n_requests, "P50_ms": None, "P99_ms": None}
+        percentile = lambda p: round(1000 * latencies[min(int(p * len(latencies)), len(latencies) - 1)], 3)
+        return {"Requests": n_requests, "P50_ms": percentile(0.50), "P99_ms": percentile(0.99)}
+
+    def close(self):
+        """Stop the workers"""
+        if self.pool is not None:
+            self.pool.shutdown()
+
+def _dumps(response:dict) -> str:
+    # Errors may hold exceptions, written as text
+    return json.dumps(response, default=str)
+
+def serve_stdio(server:TranslationServer, source=None, output=None):
+    """Answer JSON line requests until the end of the input.
+    Requests are sent to the workers as soon as they are read, so the responses may come out of order, matched by id.
+    :param server: Translation server
+    :param source: Input lines, sys.stdin by default
+    :param output: Output text file, sys.stdout by default
+    """
+    source = sys.stdin if source is None else source
+    output = sys.stdout if output is None else output
+    lock = threading.Lock()
+    pending = threading.Semaphore(0)
+    n_requests = 0
+    def write(response:dict):
+        with lock:
+            output.write(_dumps(response) + "\n")
+            output.flush()
+        pending.release()
+    for line in source:
+        if not line.strip():
+            continue
+        n_requests += 1
+        try:
+            request = json.loads(line)
+        except ValueError as err:
+            write({"id": None, "error": f"--SERVER:INVALID JSON:{err}"})
+            continue
+        server.submit_batch(request, write) if isinstance(request, list) else server.submit(request, write)
+    for _ in range(n_requests):
+        pending.acquire()
+
+def serve_http(server:TranslationServer, host:str='127.0.0.1', port:int=8765):
+    """Answer requests posted as JSON, a list of requests is answered with a list of responses.
+    GET /stats returns the latency statistics.
+    :param server: Translation server
+    :param host: Address to listen on
+    :param port: Port to listen on
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status:int, body):
+            data = _dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                return self._send(200, server.stats())
+            self._send(404, {"error": "Not found"})
+
+        def do_POST(self):
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError as err:
+                return self._send(400, {"error": f"--SERVER:INVALID JSON:{err}"})
+            self._send(200, server.translate(request))
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    logger.info("--SERVER:listening on http://%s:%s", host, port)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
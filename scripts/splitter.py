@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Statement Splitter Implementation"""
+import codecs
+import io
+import re
+from bisect import bisect_left
+
+class StatementSplitter():
+    """Single pass SQL tokenizer that yields the script statements without comments.
+    Quotes, backticks, -- comments and /* */ comments are understood, so semicolons
+    inside them do not end a statement. The source is read in chunks and only the
+    current statement is kept in memory."""
+
+    # Tokens that change the state outside quotes and comments
+    _TOKENS = re.compile(r"--|/\*|[;'\"`]")
+    # Closing quote, skipping backslash escapes
+    _QUOTES = {"'": re.compile(r"\\.|'", re.DOTALL), '"': re.compile(r'\\.|"', re.DOTALL), '`': re.compile(r'`')}
+    # Carriage returns folded to line breaks, as with universal newlines
+    _CR = re.compile(r"\r\n?")
+    # Characters read from the source at a time
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, source, track_offsets:bool=False):
+        """Initialize the splitter class
+        :param source: SQL script as a string or a text file object
+        :param track_offsets: If true, offset keeps the byte offset where the last statement starts, counted in the
+            encoding of the source, UTF-8 for a string. Open files with newline='' so their line breaks are counted as
+            they are written, they are then read as with universal newlines
+        """
+        self.from_file = not isinstance(source, str)
+        self.source = io.StringIO(source) if isinstance(source, str) else source
+        self.track_offsets = track_offsets
+        self.tail = ""
+        self.rest = ""
+        self.n_statements = 0
+        self.offset = 0
+
+    @classmethod
+    def strip_comments(cls, query:str) -> str:
+        """Remove -- and /* */ comments outside quotes
+        :return: query without comments
+        """
+        splitter = cls(query)
+        return "".join(splitter) + splitter.rest
+
+    def __iter__(self):
+        """Yield each statement, ended by its semicolon, without comments.
+        After the iteration, tail keeps the raw text after the last semicolon and rest the same text without comments.
+        A statement starts right after the previous semicolon, so its offset includes the comments and spaces before it.
+        A byte order mark at the start of the source is not part of the first statement.
+        The source is read in chunks of CHUNK_SIZE characters, so a script without line breaks is not read at once.
+        """
+        state = None # None, a quote character, '--' or '/*'
+        clean = list()
+        raw = list() # raw text after the last semicolon, of the previous chunks
+        track = self.track_offsets
+        fold = track and self.from_file
+        crlf = list()
+        if track:
+            # A single encoder over the source, so a signature is counted once
+            encoder = codecs.getincrementalencoder(getattr(self.source, "encoding", None) or "utf-8")
+            encode = encoder().encode
+            # Bytes of the carriage return of each folded \r\n
+            encode_cr = encoder().encode
+            encode_cr("")
+            cr_size = len(encode_cr("\r"))
+            size = lambda start, stop: len(encode(text[start:stop])) + cr_size * (bisect_left(crlf, stop) - bisect_left(crlf, start))
+        consumed = 0 # bytes before counted
+        start_offset = 0 # bytes before the current statement
+        first = True
+        carry = ""
+        while True:
+            chunk = self.source.read(self.CHUNK_SIZE)
+            final = not chunk
+            text = carry + chunk
+            carry = ""
+            if first and text:
+                first = False
+                if text.startswith('\ufeff'):
+                    consumed += len(encode('\ufeff')) if track else 0
+                    text = text[1:]
+            if fold:
+                # A carriage return may be followed by a line break in the next chunk
+                if not final and text.endswith('\r'):
+                    carry, text = '\r', text[:-1]
+                text, crlf = self._fold(text)
+            pos = 0
+            end = len(text)
+            raw_start = 0 # start of the raw text after the last semicolon in text
+            counted = 0 # characters of text already in consumed
+            while pos < end:
+                if state is None:
+                    token = self._TOKENS.search(text, pos)
+                    if token is None:
+                        # A dash or slash may start a comment with the next chunk
+                        if not final and text.endswith(('-', '/')):
+                            end -= 1
+                        clean.append(text[pos:end])
+                        break
+                    start, stop = token.span()
+                    word = token.group()
+                    if word == ';':
+                        clean.append(text[pos:stop])
+                        if track:
+                            self.offset = start_offset
+                            consumed += size(counted, stop)
+                            counted = stop
+                            start_offset = consumed
+                        yield "".join(clean)
+                        self.n_statements += 1
+                        clean, raw = list(), list()
+                        raw_start = stop
+                    elif word in ('--', '/*'):
+                        clean.append(text[pos:start])
+                        state = word
+                    else:
+                        clean.append(text[pos:stop])
+                        state = word
+                    pos = stop
+                elif state == '--':
+                    stop = text.find('\n', pos)
+                    if stop < 0:
+                        break
+                    # The line break is kept
+                    pos = stop
+                    state = None
+                elif state == '/*':
+                    stop = text.find('*/', pos)
+                    if stop < 0:
+                        if not final and text.endswith('*'):
+                            end -= 1
+                        break
+                    pos = stop + 2
+                    state = None
+                else:
+                    search = self._QUOTES[state].search
+                    token = search(text, pos)
+                    last = pos
+                    while token is not None and token.group() != state:
+                        last = token.end()
+                        token = search(text, last)
+                    if token is None:
+                        # A backslash may escape the first character of the next chunk
+                        if not final and state != '`' and text.endswith('\\') and last < end:
+                            end -= 1
+                        clean.append(text[pos:end])
+                        break
+                    clean.append(text[pos:token.end()])
+                    pos = token.end()
+                    state = None
+            carry = text[end:] + carry
+            raw.append(text[raw_start:end])
+            if track:
+                consumed += size(counted, end)
+            if final:
+                break
+        self.tail = "".join(raw)
+        self.rest = "".join(clean)
+
+    @classmethod
+    def _fold(cls, text:str) -> tuple:
+        """Line breaks as with universal newlines
+        :return: text with \\n line breaks + positions of the ones folded from \\r\\n
+        """
+        if '\r' not in text:
+            return text, list()
+        parts = list()
+        crlf = list()
+        pos = 0
+        n_folded = 0
+        for match in cls._CR.finditer(text):
+            parts.append(text[pos:match.start()])
+            parts.append('\n')
+            if match.end() - match.start() == 2:
+                crlf.append(match.start() - n_folded)
+                n_folded += 1
+            pos = match.end()
+        parts.append(text[pos:])
+        return "".join(parts), crlf
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Summary Aggregator Implementation
+
+translate_files adds the summary of each file to a SummaryAggregator, which keeps
+running totals. The per-file summaries are kept in memory, or written to a JSON lines
+store and read back one file at a time, so the memory used does not grow with the
+number of files.
+"""
+import heapq
+import json
+from collections import Counter
+from collections.abc import ItemsView, Mapping
+
+class _StoredItems(ItemsView):
+    """Items of a FileSummaries view, read in a single pass over the store"""
+
+    def __iter__(self):
+        return self._mapping._records()
+
+class FileSummaries(Mapping):
+    """Read only view of the per-file summaries written to a JSON lines store.
+    Iterating reads the store one line at a time; looking a file up reads it until the file is found."""
+
+    def __init__(self, path:str, n_files:int):
+        """Initialize the view class
+        :param path: JSON lines store
+        :param n_files: Number of files in the store
+        """
+        self.path = path
+        self.n_files = n_files
+
+    def _records(self):
+        with open(self.path) as f:
+            for line in f:
+                record = json.loads(line)
+                yield record["File"], record["Summary"]
+
+    def __iter__(self):
+        return (f_name for f_name, _ in self._records())
+
+    def items(self) -> ItemsView:
+        return _StoredItems(self)
+
+    def __getitem__(self, f_name:str) -> list:
+        for name, summary in self._records():
+            if name == f_name:
+                return summary
+        raise KeyError(f_name)
+
+    def __len__(self) -> int:
+        return self.n_files
+
+    def __repr__(self):
+        return f"FileSummaries({self.path!r}, {self.n_files} files)"
+
+class SummaryAggregator():
+    """Running totals of the file summaries of a translate_files run"""
+
+    def __init__(self, input_dir:str, from_dialect:str, to_dialect:str, store:str=None, top:int=20):
+        """Initialize the aggregator class
+        :param input_dir: Input Directory
+        :param from_dialect: From SQL dialect
+        :param to_dialect: To SQL dialect
+        :param store: Optional JSON lines file where the per-file summaries are written instead of kept in memory
+        :param top: Number of files with most failed queries kept
+        """
+        self.input_dir = input_dir
+        self.from_dialect = from_dialect
+        self.to_dialect = to_dialect
+        self.store = store
+        self.top = top
+        self.success_files = 0
+        self.failed_files = 0
+        self.n_queries = 0
+        self.success = 0
+        self.failed = Counter()
+        self.er_types = Counter()
+        self.time = 0.0
+        # Statements copied without being parsed, None if no file summary has Copied
+        self.copied = None
+        self._worst = list()
+        self._n_files = 0
+        self._files = dict() if store is None else None
+        self._store = open(store, "w") if store is not None else None
+
+    def add(self, f_name:str, summary:list, location:str):
+        """Add the summary of a file
+        :param f_name: File name
+        :param summary: File summary, as returned by Reader.translate_file
+        :param location: Output folder of the file, "Fully Translated" or "Partially Translated"
+        """
+        row = dict()
+        for item in summary:
+            row.update(item)
+        if location == "Partially Translated":
+            self.failed_files += 1
+        else:
+            self.success_files += 1
+        self.n_queries += row.get("N_queries", 0)
+        self.success += row.get("Success", 0)
+        self.failed.update(row.get("Failed", dict()))
+        self.er_types.update(row.get("Er_types", list()))
+        self.time += row.get("Time", 0)
+        if "Copied" in row:
+            self.copied = (self.copied or 0) + row["Copied"]
+        n_failed = sum(row.get("Failed", dict()).values())
+        if n_failed:
+            item = (n_failed, -self._n_files, f_name)
+            if len(self._worst) < self.top:
+                heapq.heappush(self._worst, item)
+            elif item > self._worst[0]:
+                heapq.heapreplace(self._worst, item)
+        self._n_files += 1
+        if self._store is not None:
+            self._store.write(json.dumps({"File": f_name, "Summary": summary}) + "\n")
+        else:
+            self._files[f_name] = summary
+
+    def close(self):
+        """Close the per-file store"""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def totals(self) -> dict:
+        """Totals of every file
+        :return: dictionary with N_queries, Success, Failed, Er_types, Time and Worst_files, and Copied with pass-through
+        """
+        worst = [{"File": f_name, "Failed": n_failed} for n_failed, _, f_name in sorted(self._worst, reverse=True)]
+        totals = {"N_queries": self.n_queries, "Success": self.success, "Failed": dict(self.failed),
+                  "Er_types": dict(self.er_types.most_common()), "Time": round(self.time, 6), "Worst_files": worst}
+        if self.copied is not None:
+            totals["Copied"] = self.copied
+        return totals
+
+    def to_dict(self) -> dict:
+        """Summary of the run, as returned by Reader.translate_files
+        :return: dictionary with the dialects, file counts, totals and the per-file summaries
+        """
+        self.close()
+        files = self._files if self.store is None else FileSummaries(self.store, self._n_files)
+        return {"Input_dir": self.input_dir, "From_dialect": self.from_dialect, "To_dialect": self.to_dialect,
+                "Sucess_files": self.success_files, "Failed_files": self.failed_files, "Files": files, "Totals": self.totals()}
@@ -16,10 +16,60 @@
 #
 """Transpiler Class Implementation"""
 from dora_parser.dialects import WordToImplement
-from dora_parser.parser import Parser
-from dora_parser import logger
+from dora_parser.parser import Parser, ParserError
+from dora_parser.registry import DIALECTS, load_dialect
+from dora_parser.cache import LRUCache
+from dora_parser import logger, profiler
+from collections import deque
+from itertools import islice
+import os
+
+SUPPORTED_DIALECTS = list(DIALECTS)
+# Actions of the resolve stack
+_VISIT, _BUILD_DICT, _BUILD_LIST = object(), object(), object()
+# Queries sent to each executor task of translate_many by default
+CHUNKSIZE = 256
+
+def structured_error(problem:dict) -> dict:
+    """Convert a translation problem to a dictionary
+    :param problem: problem as {word: "LEVEL:CODE:detail"}, as returned by translate
+    :return: dictionary with Word, Level, Code and Detail
+    """
+    word, value = next(iter(problem.items()))
+    parts = str(value).split(":", 2)
+    if len(parts) == 3 and parts[1].isdigit():
+        return {"Word": str(word), "Level": parts[0], "Code": int(parts[1]), "Detail": parts[2]}
+    return {"Word": str(word), "Level": None, "Code": None, "Detail": str(value)}
+
+class TranslationResult():
+    """Result of a query translated by translate_many"""
+    __slots__ = ('index', 'sql', 'errors')
+
+    def __init__(self, index:int, sql:str, errors:tuple):
+        """Initialize the result class
+        :param index: Query position in the input
+        :param sql: Translated query, None if it could not be parsed
+        :param errors: Structured errors, see structured_error
+        """
+        self.index = index
+        self.sql = sql
+        self.errors = errors
+
+    def __repr__(self):
+        return f"TranslationResult(index={self.index!r}, sql={self.sql!r}, errors={self.errors!r})"
+
+# Transpiler of each dialect pair, per executor process
+_CHUNK_TRANSPILERS = dict()
+
+def _translate_chunk(from_dialect:str, to_dialect:str, queries:list) -> dict:
+    """Translate a chunk of distinct queries inside an executor
+    :return: dictionary with the result of each query
+    """
+    transpiler = _CHUNK_TRANSPILERS.get((from_dialect, to_dialect))
+    if transpiler is None:
+        transpiler = _CHUNK_TRANSPILERS[(from_dialect, to_dialect)] = Transpiler(from_dialect, to_dialect)
+    return {query: transpiler._translate_query(query) for query in queries}
 
-SUPPORTED_DIALECTS = ['spark','presto','impala','hive', 'athena']
 class Transpiler:
     """Transpiler Object"""
     @classmethod
@@ -27,22 +77,7 @@ class Transpiler:
         """Import Dialect by parameter
         :param dialect: Dialect name
         :return: Dialect class"""
-        if dialect == 'spark':
-            from dora_parser.dialects.spark import Spark
-            return Spark
-        if dialect == 'presto':
-            from dora_parser.dialects.presto import Presto
-            return Presto
-        if dialect == 'impala':
-            from dora_parser.dialects.impala import Impala
-            return Impala
-        if dialect == 'hive':
-            from dora_parser.dialects.hive import Hive
-            return Hive
-        if dialect == 'athena':
-            from dora_parser.dialects.athena import Athena
-            return Athena
-        raise ValueError(f"--TRANSPILER:DIALECT:{dialect}: NotImplemented'")
+        return load_dialect(dialect)
 
     def __init__(self, from_dialect:str, to_dialect:str):
         """Initialize the transpiler class
@@ -52,44 +87,90 @@ class Transpiler:
         _from_dialect = str(from_dialect).lower()
         _to_dialect = str(to_dialect).lower()
         logger.debug("%s -> %s", _from_dialect, _to_dialect)
-        if _from_dialect not in SUPPORTED_DIALECTS or _to_dialect not in SUPPORTED_DIALECTS:
-            raise ValueError(f"Only the following dialects are supported:{SUPPORTED_DIALECTS}")
+        if _from_dialect not in DIALECTS or _to_dialect not in DIALECTS:
+            raise ValueError(f"Only the following dialects are supported:{list(DIALECTS)}")
+        self.from_dialect = _from_dialect
+        self.to_dialect = _to_dialect
         self.dialect = Transpiler._import_dialect(_to_dialect)(source=_from_dialect)
         self._errors = list()
+        self._dispatch = None
+        self._words = dict()
 
-    def resolve(self, tree:dict) -> dict:
-        """Resolve tree based on dialect recursively
-        :return: the resulting tree
+    @property
+    def dispatch(self) -> dict:
+        """Dialect words by upper case name, built once per dialect instance"""
+        if self._dispatch is None:
+            self._dispatch = dict(self.dialect.words)
+        return self._dispatch
+
+    def _word(self, key) -> str:
+        """Dialect word of a tree key, memoized by key
+        :return: upper case word, or None if the dialect does not handle the key
         """
-        if isinstance(tree, dict):
-            for key, value in tree.items():
-                self.resolve(value)
+        try:
+            return self._words[key]
+        except KeyError:
+            _word = str(key).upper()
+            self._words[key] = _word if _word in self.dispatch else None
+            return self._words[key]
+
+    def _rewrite(self, node:dict, values:list) -> dict:
+        """Build the resolved dictionary from its keys and already resolved values
+        :param node: original dictionary
+        :param values: resolved values, in the order of the dictionary keys
+        :return: the resulting dictionary
+        """
+        tree = dict()
+        for key, value in zip(node, values):
+            try:
+                _word = self._word(key)
+                if _word is None:
+                    tree[key] = value
+                    continue
                 try:
-                    _word = str(key).upper()
-                    if _word in self.dialect.words:
-                        _old = tree.pop(key)
-                        try:
-                            _new = self.dialect.words[_word](value)
-                        except Exception as err:
-                            logger.error("--DIALECT:IMPLEMENTATION:ERROR:'%s':'%s'",_word,err)
-                            _new = WordToImplement(err)
-                        if isinstance(_new, WordToImplement):
-                            logger.warning("%s NotImplemented:\n--TRANSPILER:%s:LEVEL%s:'%s'", key, _new.id, _new.level, key)
-                            self._errors.append({key:(str(_new.id) + ":" + str(_new.level) + ":" + str(_new))})
-                            tree[_word]=_old
-                        elif isinstance(_new, dict):
-                            for _key, _value in _new.items():
-                                tree[_key]=_value
-                                if str(_key).lower() != str(_word).lower():
-                                    logger.info("--TRANSLATE:'%s' TO '%s'",_word, _new)
-                        return tree
+                    _new = self.dispatch[_word](value)
                 except Exception as err:
-                    logger.error('%s:%s',key,err)
-                    self._errors.append({key:err})
-        if isinstance(tree, list):
-            for value in tree:
-                self.resolve(value)
+                    logger.error("--DIALECT:IMPLEMENTATION:ERROR:'%s':'%s'",_word,err)
+                    _new = WordToImplement(err)
+                if isinstance(_new, WordToImplement):
+                    logger.warning("%s NotImplemented:\n--TRANSPILER:%s:LEVEL%s:'%s'", key, _new.id, _new.level, key)
+                    self._errors.append({key:(str(_new.id) + ":" + str(_new.level) + ":" + str(_new))})
+                    tree[_word]=value
+                elif isinstance(_new, dict):
+                    for _key, _value in _new.items():
+                        tree[_key]=_value
+                        if str(_key).lower() != str(_word).lower():
+                            logger.info("--TRANSLATE:'%s' TO '%s'",_word, _new)
+            except Exception as err:
+                logger.error('%s:%s',key,err)
+                self._errors.append({key:err})
         return tree
+
+    def resolve(self, tree:dict) -> dict:
+        """Resolve tree based on dialect, children before parents.
+        Uses an explicit stack instead of recursion and builds a new tree, the given one is not changed.
+        :return: the resulting tree
+        """
+        values = list()
+        stack = [(_VISIT, tree)]
+        while stack:
+            action, node = stack.pop()
+            if action is _VISIT:
+                if isinstance(node, dict):
+                    stack.append((_BUILD_DICT, node))
+                    stack.extend((_VISIT, value) for value in reversed(list(node.values())))
+                elif isinstance(node, list):
+                    stack.append((_BUILD_LIST, node))
+                    stack.extend((_VISIT, value) for value in reversed(node))
+                else:
+                    values.append(node)
+            else:
+                # The resolved children are the last values pushed
+                start = len(values) - len(node)
+                children = values[start:]
+                del values[start:]
+                values.append(children if action is _BUILD_LIST else self._rewrite(node, children))
+        return values[0]
     
     def format(self, tree, **kwargs) -> str:
         """Format to SQL Query, based on dialect
@@ -103,8 +184,88 @@ class Transpiler:
         :return: list with two values: SQL query and problems
         """
         self._errors = list() # Clean older errors
-        _tree = self.resolve(parse.tree)
+        prof = profiler.active()
+        with prof.stage("resolve"):
+            _tree = self.resolve(parse.tree)
         logger.debug("RESOLVE:%s", _tree)
+        with prof.stage("format"):
+            _sql = self.format(_tree, **kwargs)
         return [
-            self.format(_tree, **kwargs),# Query
+            _sql,# Query
             self._errors] # Problems
+
+    def _translate_query(self, query:str) -> tuple:
+        """Parse and translate a query
+        :return: SQL query, None if it could not be parsed + structured errors
+        """
+        try:
+            sql, problems = self.translate(Parser(query))
+        except ParserError as err:
+            return None, ({"Word": "parser", "Level": "HARD", "Code": 30, "Detail": str(err)},)
+        return sql, tuple(structured_error(problem) for problem in problems)
+
+    def translate_many(self, queries, chunksize:int=None, executor=None, cache_size:int=4096):
+        """Translate an iterable of queries, yielding the results in the input order as they are ready.
+        Identical queries, ignoring surrounding spaces, are translated once while they are kept in the batch cache.
+        :param queries: Iterable or generator of SQL strings
+        :param chunksize: Number of queries sent to each executor task
+        :param executor: Optional concurrent.futures executor, as a ProcessPoolExecutor
+        :param cache_size: Number of distinct results kept to answer repeated queries
+        :return: generator of TranslationResult
+        """
+        cache = LRUCache(cache_size)
+        if executor is not None:
+            yield from self._translate_chunks(queries, chunksize or CHUNKSIZE, executor, cache)
+            return
+        for index, query in enumerate(queries):
+            key = query.strip()
+            result = cache.get(key)
+            if result is None:
+                result = self._translate_query(key)
+                cache.put(key, result)
+            yield TranslationResult(index, *result)
+
+    def _translate_chunks(self, queries, chunksize:int, executor, cache:LRUCache):
+        """Send the distinct queries of each chunk to the executor, keeping a few chunks in flight
+        :return: generator of TranslationResult
+        """
+        queries = iter(queries)
+        in_flight = deque()
+        # Future of each query submitted and not yet in the cache
+        owners = dict()
+        index = 0
+        window = 2 * (os.cpu_count() or 1)
+        while True:
+            chunk = [query.strip() for query in islice(queries, chunksize)]
+            if chunk:
+                sources = list()
+                distinct = list()
+                for key in chunk:
+                    if (result := cache.get(key)) is not None:
+                        sources.append(result)
+                    elif key in owners:
+                        sources.append(owners[key])
+                    else:
+                        sources.append(None)
+                        distinct.append(key)
+                        owners[key] = None
+                future = executor.submit(_translate_chunk, self.from_dialect, self.to_dialect, distinct) if distinct else None
+                for key in distinct:
+                    owners[key] = future
+                sources = [future if source is None else source for source in sources]
+                in_flight.append((index, chunk, sources, distinct, future))
+                index += len(chunk)
+            if not in_flight or (chunk and len(in_flight) < window):
+                if not chunk and not in_flight:
+                    return
+                continue
+            start, chunk, sources, distinct, future = in_flight.popleft()
+            for i, (key, source) in enumerate(zip(chunk, sources)):
+                result = source.result()[key] if not isinstance(source, tuple) else source
+                yield TranslationResult(start + i, *result)
+            if future is not None:
+                results = future.result()
+                for key in distinct:
+                    cache.put(key, results[key])
+                    if owners.get(key) is future:
+                        del owners[key]
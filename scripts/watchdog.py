@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2021 Compasso UOL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Parse Watchdog Implementation
+
+Statements are parsed in a child process, so a parse that takes longer than the
+time limit can be stopped: the child is killed, the statement fails with
+ParseTimeout and a new child is started for the next statement.
+"""
+import multiprocessing
+import os
+from dora_parser.backends import ParserError, load_backend
+from dora_parser import logger
+
+class ParseTimeout(ParserError):
+    """The statement was not parsed within the time limit"""
+
+    def __init__(self, query:str, timeout:float, backend:str=None):
+        """Initialize the exception class
+        :param query: Statement that was not parsed
+        :param timeout: Time limit in seconds
+        :param backend: Backend name
+        """
+        super().__init__(f"--PARSER:TIMEOUT: not parsed in {timeout}s", query, backend)
+        self.timeout = timeout
+
+def _parse_loop(conn, backend:str=None):
+    """Parse the statements received until None
+    :param conn: Child end of the pipe
+    :param backend: Parser backend name
+    """
+    backend = load_backend(backend)
+    # The grammar is built before the first statement, out of its time limit
+    backend.parse("SELECT 1")
+    conn.send(("ready", None))
+    while (query := conn.recv()) is not None:
+        try:
+            conn.send(("tree", backend.parse(query)))
+        except backend.errors as err:
+            conn.send(("parse_error", str(err)))
+        except Exception as err:
+            conn.send(("error", repr(err)))
+
+class ParseWatchdog():
+    """Child process that parses statements under a time limit"""
+
+    def __init__(self, timeout:float, backend:str=None):
+        """Initialize the watchdog class
+        :param timeout: Time limit of each statement, in seconds
+        :param backend: Parser backend name, the default backend if None
+        """
+        self.timeout = float(timeout)
+        self.backend = backend
+        self.process = None
+        self.conn = None
+        self.pid = None
+        self.n_timeouts = 0
+
+    def start(self):
+        """Start the child process and wait until it is ready"""
+        conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_parse_loop, args=(child, self.backend), daemon=True)
+        self.process.start()
+        child.close()
+        self.conn = conn
+        self.pid = os.getpid()
+        self.conn.recv()
+
+    def stop(self):
+        """Stop the child process"""
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def parse(self, query:str) -> dict:
+        """Parse a statement in the child process
+        :param query: SQL query
+        :return: parse tree
+        :raises ParseTimeout: if the statement is not parsed within the time limit
+        :raises ParserError: if the statement can not be parsed
+        """
+        if self.pid != os.getpid():
+            # Copied by a fork, the child process belongs to the parent
+            self.process = None
+            self.conn = None
+        if self.process is None or not self.process.is_alive():
+            self.start()
+        self.conn.send(query)
+        if not self.conn.poll(self.timeout):
+            self.n_timeouts += 1
+            logger.error("Query not parsed in %ss, restarting the parser process", self.timeout)
+            self.stop()
+            raise ParseTimeout(query, self.timeout, self.backend)
+        kind, value = self.conn.recv()
+        if kind == "tree":
+            return value
+        if kind == "parse_error":
+            raise ParserError(value, query, self.backend)
+        raise RuntimeError(f"--PARSER:WATCHDOG:{value}")